@@ -2,6 +2,74 @@ from server import PromptServer
 from aiohttp import web
 import json
 import os
+import uuid
+import asyncio
+
+from .previews import PreviewWorker
+from .run_history import RunHistory
+from .eta import EtaEstimator, ETA_EVENT
+from .observers import CompactObserverHub
+from .idempotency import IdempotencyCache
+from .system_stats import SystemStatsCache, comfy_stats_computer
+from .sweep import SweepTracker, SweepError, expand_sweep, enqueue_variants
+from .fair_share import FairScheduler, parse_quotas
+
+
+def get_observer_sids():
+    # Observer clients (Run Button App) connect with a client_id starting with "run_button_observer"
+    return [sid for sid in list(PromptServer.instance.sockets.keys()) if str(sid).startswith("run_button_observer")]
+
+def get_queue_snapshot():
+    # Newer ComfyUI offers a read-only view that skips deep-copying the whole queue
+    prompt_queue = PromptServer.instance.prompt_queue
+    return getattr(prompt_queue, "get_current_queue_volatile", prompt_queue.get_current_queue)()
+
+def lookup_running_prompt(prompt_id):
+    # Items in the prompt queue are (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+    running, _queued = get_queue_snapshot()
+    for item in running:
+        if item[1] == prompt_id:
+            return item[2]
+    return None
+
+def list_queued_prompts():
+    _running, queued = get_queue_snapshot()
+    return [(item[1], item[2]) for item in sorted(queued, key=lambda item: item[0])]
+
+def client_ip_of(sid):
+    # Remote address of a connected ComfyUI client (websocket), or None
+    handler = PromptServer.instance.sockets.get(sid)
+    try:
+        if hasattr(handler, 'request') and handler.request:
+             return handler.request.remote
+        elif hasattr(handler, 'ws') and hasattr(handler.ws, '_request'):
+             return handler.ws._request.remote
+    except: pass
+    return None
+
+def make_fair_scheduler(history):
+    # RUN_BUTTON_FAIR_SHARE=1: interleave queued prompts round-robin by user (binding code or IP)
+    # RUN_BUTTON_FAIR_QUOTA: max pending prompts per user (0 = unlimited)
+    # RUN_BUTTON_FAIR_QUOTAS="CODE=50,192.168.1.7=5": per-user overrides
+    if os.environ.get("RUN_BUTTON_FAIR_SHARE") != "1":
+        return None
+    print("[RunButton] Fair-share queue ordering enabled.")
+    return FairScheduler(history, PromptServer.instance.prompt_queue, owner_for_client=client_ip_of,
+                         quota=int(os.environ.get("RUN_BUTTON_FAIR_QUOTA", "0")),
+                         quotas=parse_quotas(os.environ.get("RUN_BUTTON_FAIR_QUOTAS")))
+
+def get_data_dir():
+    # Prefer ComfyUI's user directory so history survives reinstalling the node
+    try:
+        import folder_paths
+        path = os.path.join(folder_paths.get_user_directory(), "run_button")
+    except Exception:
+        path = os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# Events observers need to follow execution (besides 'status', which ComfyUI broadcasts)
+OBSERVER_EVENTS = ["progress", "executing", "execution_start", "execution_error", "execution_interrupted", "execution_cached"]
 
 # --- Monkey Patch to Broadcast Progress ---
 # By default, ComfyUI sends progress/execution events ONLY to the client that triggered the prompt.
@@ -12,45 +80,90 @@ import os
 if not hasattr(PromptServer.instance.send_sync, "__run_button_patched__"):
     original_send_sync = PromptServer.instance.send_sync
 
+    # Observers that negotiated the compact encoding (/run_button/observer)
+    compact_observers = CompactObserverHub(
+        lambda: PromptServer.instance.loop,
+        initial_events=lambda: [("status", {"status": PromptServer.instance.get_queue_info()})])
+
+    def has_observers():
+        return bool(compact_observers) or bool(get_observer_sids())
+
+    def publish_to_observers(event, data):
+        # Our own events (previews, ETA, ...) go to every observer, legacy and compact
+        for obs_sid in get_observer_sids():
+            try: original_send_sync(event, data, sid=obs_sid)
+            except: pass
+        compact_observers.publish(event, data)
+
+    # Thumbnails of image outputs are produced off the executor thread and pushed to observers
+    preview_worker = PreviewWorker(publish_to_observers, has_observers)
+    # Run history: every execution event is recorded, whoever submitted the prompt
+    run_history = RunHistory(os.path.join(get_data_dir(), "run_history.sqlite3"), prompt_lookup=lookup_running_prompt)
+    eta_estimator = EtaEstimator(run_history, queued_prompts=list_queued_prompts,
+                                 publish=lambda snapshot: publish_to_observers(ETA_EVENT, snapshot))
+    # Parameter sweeps: "k of N" progress from the same history events
+    sweep_tracker = SweepTracker(run_history, publish=publish_to_observers)
+    fair_scheduler = make_fair_scheduler(run_history)
+
     def broadcast_send_sync(event, data, sid=None):
         # 1. Perform the original behavior (unicast or broadcast as intended)
         original_send_sync(event, data, sid)
+        run_history.feed(event, data)
+
+        # Output previews: only queue work when someone is watching
+        if event == "executed" and has_observers():
+            preview_worker.submit(data)
+
+        # Compact observers are not ComfyUI clients, so they get broadcasts and unicasts alike
+        if event in OBSERVER_EVENTS or event in ("status", "execution_success"):
+            compact_observers.publish(event, data)
         
         # 2. If it was a unicast message (sid is set) AND it's a status update we care about
         # We want to forward this to our Observer Clients (FloatRun App)
         # Note: 'progress' event is high-frequency. Since we fixed the infinite recursion bug,
         # it is now safe to broadcast it again so the float ball shows progress.
-        if sid is not None and event in ["progress", "executing", "execution_start", "execution_error", "execution_interrupted", "execution_cached"]:
+        if sid is not None and event in OBSERVER_EVENTS:
             
             # Find all observer clients (Run Button App)
             # We identify them by their client_id starting with "run_button_observer"
-            sockets = PromptServer.instance.sockets
-            
-            # Optimization: Check if we have any observers before iterating
-            has_observers = False
             # This is O(N) unfortunately, but we can't easily maintain a separate list without hooking connection events.
-            # However, removing "progress" event reduces the frequency of this check by 90%.
-            
-            for obs_sid in list(sockets.keys()):
-                # Note: client_id is usually the key in sockets dict
-                # But let's be safe and check if it's a string
-                if str(obs_sid).startswith("run_button_observer"):
-                    # Send a COPY of the event to this observer
-                    # We use original_send_sync with the observer's SID
-                    # This avoids infinite recursion and avoids broadcasting to everyone
-                    try:
-                        original_send_sync(event, data, sid=obs_sid)
-                    except:
-                        pass
+            for obs_sid in get_observer_sids():
+                # Send a COPY of the event to this observer
+                # We use original_send_sync with the observer's SID
+                # This avoids infinite recursion and avoids broadcasting to everyone
+                try:
+                    original_send_sync(event, data, sid=obs_sid)
+                except:
+                    pass
 
     # Mark as patched
     broadcast_send_sync.__run_button_patched__ = True
+    broadcast_send_sync.compact_observers = compact_observers
+    broadcast_send_sync.publish_to_observers = publish_to_observers
+    broadcast_send_sync.preview_worker = preview_worker
+    broadcast_send_sync.run_history = run_history
+    broadcast_send_sync.eta_estimator = eta_estimator
+    broadcast_send_sync.sweep_tracker = sweep_tracker
+    broadcast_send_sync.fair_scheduler = fair_scheduler
     
     # Apply the patch
     PromptServer.instance.send_sync = broadcast_send_sync
     print("[RunButton] Patched PromptServer.send_sync to intelligently forward progress events.")
 else:
     print("[RunButton] PromptServer.send_sync already patched. Skipping.")
+    _patched = PromptServer.instance.send_sync
+    compact_observers = getattr(_patched, "compact_observers", None) or CompactObserverHub(lambda: PromptServer.instance.loop)
+    publish_to_observers = getattr(_patched, "publish_to_observers", None) or \
+        (lambda event, data: [_patched(event, data, sid=obs_sid) for obs_sid in get_observer_sids()])
+    preview_worker = getattr(_patched, "preview_worker", None) or \
+        PreviewWorker(publish_to_observers, lambda: bool(get_observer_sids()))
+    run_history = getattr(_patched, "run_history", None) or \
+        RunHistory(os.path.join(get_data_dir(), "run_history.sqlite3"), prompt_lookup=lookup_running_prompt)
+    eta_estimator = getattr(_patched, "eta_estimator", None) or \
+        EtaEstimator(run_history, queued_prompts=list_queued_prompts)
+    sweep_tracker = getattr(_patched, "sweep_tracker", None) or \
+        SweepTracker(run_history, publish=publish_to_observers)
+    fair_scheduler = getattr(_patched, "fair_scheduler", None) or make_fair_scheduler(run_history)
 
 
 # --- Binding Map ---
@@ -66,6 +179,8 @@ async def register_binding(request):
         
         if binding_id and client_id:
             BINDING_MAP[binding_id] = client_id
+            if fair_scheduler:
+                fair_scheduler.assign(client_id, binding_id)
             print(f"[RunButton] 🔗 Registered binding: '{binding_id}' -> '{client_id}'")
             return web.json_response({"status": "ok"})
         else:
@@ -74,86 +189,120 @@ async def register_binding(request):
         print(f"[RunButton] Error registering binding: {e}")
         return web.json_response({"status": "error", "message": str(e)}, status=500)
 
+# --- Browser Target Selection ---
+def find_target_sid(data, request_ip):
+    """The ComfyUI client to act for a desktop request (trigger, sweep request), or None."""
+    client_ip = data.get("clientIp") 
+    target_client_id = data.get("targetClientId") # The specific browser ID to target (from local handshake)
+    target_binding_id = data.get("targetBindingId") # NEW: The manual pairing code
+    
+    target_sid = None
+
+    sockets = PromptServer.instance.sockets
+
+    # Priority 0: Manual Binding Code (Highest Priority)
+    if target_binding_id:
+        bound_sid = BINDING_MAP.get(target_binding_id)
+        if bound_sid:
+            # Verify if this sid is still connected
+            if bound_sid in sockets:
+                target_sid = bound_sid
+                print(f"[RunButton] 🔐 Using Manual Binding Code '{target_binding_id}' -> {target_sid}")
+            else:
+                print(f"[RunButton] ⚠️ Bound client {bound_sid} (Code: {target_binding_id}) is disconnected.")
+        else:
+            print(f"[RunButton] ⚠️ Binding Code '{target_binding_id}' not registered on server.")
+
+    # Priority 1: Exact Target ID (Handshake)
+    if not target_sid and target_client_id:
+        # Check if this target is actually connected
+        if target_client_id in sockets:
+            target_sid = target_client_id
+            print(f"[RunButton] 🎯 Precision Strike: Targeting handshaked client {target_sid}")
+        else:
+            print(f"[RunButton] ⚠️ Target client {target_client_id} not found in sockets (disconnected?). Falling back...")
+
+    # If no target_sid found yet (or handshake failed/disconnected), use fallbacks
+    if not target_sid:
+        candidates = []
+        ip_matches = []
+
+        for sid in list(sockets.keys()):
+            if str(sid).startswith("run_button_observer"):
+                continue
+
+            ws_ip = client_ip_of(sid)
+
+            # Check IP Match
+            if ws_ip and (ws_ip == request_ip or ws_ip == client_ip):
+                ip_matches.append(sid)
+
+            candidates.append(sid)
+
+        # Priority 2: IP Match
+        if ip_matches:
+            target_sid = ip_matches[-1]
+            print(f"[RunButton] Found IP-matched client: {target_sid}")
+
+        # Priority 3: Most Recent
+        elif candidates:
+            target_sid = candidates[-1]
+            print(f"[RunButton] Fallback to most recent client: {target_sid}")
+
+    return target_sid
+
+def request_owner(data, request_ip):
+    # Fair-share user of a desktop request: its binding code if registered, else its address
+    code = data.get("targetBindingId")
+    if code and code in BINDING_MAP:
+        return code
+    return request_ip or data.get("clientIp") or "anonymous"
+
+def quota_refusal(owner, pending):
+    print(f"[RunButton] Quota reached for '{owner}' ({pending} queued).")
+    return web.json_response({"status": "warning", "message": f"Quota reached: {pending} runs of '{owner}' are already queued",
+                              "owner": owner, "queued": pending}, status=429)
+
+# --- Idempotency Keys ---
+# Retries of the same press carry the same key; only the first one reaches the browser
+TRIGGER_KEYS = IdempotencyCache()
+
 # --- API Endpoint: Trigger ---
 async def trigger_run(request):
     try:
         data = await request.json()
     except:
         data = {}
+
+    idempotency_key = IdempotencyCache.normalize(request.headers.get("Idempotency-Key") or data.get("idempotencyKey"))
+    if idempotency_key:
+        previous = TRIGGER_KEYS.get(idempotency_key)
+        if previous is not None:
+            print(f"[RunButton] Duplicate trigger (key {idempotency_key}) ignored.")
+            return web.json_response(dict(previous, duplicate=True), headers={"Idempotent-Replayed": "true"})
         
     client_id = data.get("clientId")
-    client_ip = data.get("clientIp") 
-    target_client_id = data.get("targetClientId") # The specific browser ID to target (from local handshake)
-    target_binding_id = data.get("targetBindingId") # NEW: The manual pairing code
-    request_ip = request.remote      
     
     try:
         # Broadcast the trigger event to ONE connected client (Unicast)
-        print(f"[RunButton] Trigger request received (from {client_id}). TargetID: {target_client_id}, BindingCode: {target_binding_id}")
-        
-        target_sid = None
-        
-        sockets = PromptServer.instance.sockets
-        
-        # Priority 0: Manual Binding Code (Highest Priority)
-        if target_binding_id:
-            bound_sid = BINDING_MAP.get(target_binding_id)
-            if bound_sid:
-                # Verify if this sid is still connected
-                if bound_sid in sockets:
-                    target_sid = bound_sid
-                    print(f"[RunButton] 🔐 Using Manual Binding Code '{target_binding_id}' -> {target_sid}")
-                else:
-                    print(f"[RunButton] ⚠️ Bound client {bound_sid} (Code: {target_binding_id}) is disconnected.")
-            else:
-                print(f"[RunButton] ⚠️ Binding Code '{target_binding_id}' not registered on server.")
-
-        # Priority 1: Exact Target ID (Handshake)
-        if not target_sid and target_client_id:
-            # Check if this target is actually connected
-            if target_client_id in sockets:
-                target_sid = target_client_id
-                print(f"[RunButton] 🎯 Precision Strike: Targeting handshaked client {target_sid}")
-            else:
-                print(f"[RunButton] ⚠️ Target client {target_client_id} not found in sockets (disconnected?). Falling back...")
+        print(f"[RunButton] Trigger request received (from {client_id}). TargetID: {data.get('targetClientId')}, BindingCode: {data.get('targetBindingId')}")
+        target_sid = find_target_sid(data, request.remote)
+
+        if target_sid and fair_scheduler:
+            # Runs this browser queues next are attributed to the requesting user
+            owner = request_owner(data, request.remote)
+            admitted, pending = fair_scheduler.admit(owner)
+            if not admitted:
+                return quota_refusal(owner, pending)
+            fair_scheduler.assign(target_sid, owner)
 
-        # If no target_sid found yet (or handshake failed/disconnected), use fallbacks
-        if not target_sid:
-            candidates = []
-            ip_matches = []
-            
-            for sid, handler in sockets.items():
-                if str(sid).startswith("run_button_observer"):
-                    continue
-                
-                # Try to get remote IP
-                ws_ip = None
-                try:
-                    if hasattr(handler, 'request') and handler.request:
-                         ws_ip = handler.request.remote
-                    elif hasattr(handler, 'ws') and hasattr(handler.ws, '_request'):
-                         ws_ip = handler.ws._request.remote
-                except: pass
-                
-                # Check IP Match
-                if ws_ip and (ws_ip == request_ip or ws_ip == client_ip):
-                    ip_matches.append(sid)
-                    
-                candidates.append(sid)
-                
-            # Priority 2: IP Match
-            if ip_matches:
-                target_sid = ip_matches[-1]
-                print(f"[RunButton] Found IP-matched client: {target_sid}")
-                
-            # Priority 3: Most Recent
-            elif candidates:
-                target_sid = candidates[-1]
-                print(f"[RunButton] Fallback to most recent client: {target_sid}")
-            
         if target_sid:
-            PromptServer.instance.send_sync("run_button.trigger", {}, sid=target_sid)
-            return web.json_response({"status": "triggered", "message": f"Sent to {target_sid}"})
+            PromptServer.instance.send_sync("run_button.trigger", {"key": idempotency_key}, sid=target_sid)
+            result = {"status": "triggered", "message": f"Sent to {target_sid}"}
+            # Only delivered triggers are remembered: a retry after "no browser" should try again
+            if idempotency_key:
+                TRIGGER_KEYS.put(idempotency_key, result)
+            return web.json_response(result)
         else:
             print("[RunButton] No valid browser client found to trigger.")
             return web.json_response({"status": "warning", "message": "No browser client connected"}, status=200)
@@ -162,6 +311,173 @@ async def trigger_run(request):
         print(f"[RunButton] Error broadcasting trigger: {e}")
         return web.json_response({"status": "error", "message": str(e)}, status=500)
 
+# --- API Endpoint: Parameter Sweep ---
+# RUN_BUTTON_SWEEP_MAX: most variants one sweep may expand to (default 1000)
+SWEEP_MAX_VARIANTS = int(os.environ.get("RUN_BUTTON_SWEEP_MAX", "1000"))
+
+async def start_sweep(request):
+    # {"prompt": <API workflow>, "workflow": <UI graph, for PNG metadata>, "grid": {...},
+    #  "mode": "product" | "zip", "front": false, "client_id": ..., "sweepId": ...}
+    # Without "prompt" the target browser (same selection as /trigger) is asked to post its
+    # current workflow back here with the same grid and sweepId.
+    try:
+        data = await request.json()
+    except:
+        data = None
+    if not isinstance(data, dict):
+        return web.json_response({"status": "error", "message": "Invalid JSON"}, status=400)
+
+    idempotency_key = IdempotencyCache.normalize(request.headers.get("Idempotency-Key") or data.get("idempotencyKey"))
+    if idempotency_key:
+        previous = TRIGGER_KEYS.get("sweep:" + idempotency_key)
+        if previous is not None:
+            return web.json_response(dict(previous, duplicate=True), headers={"Idempotent-Replayed": "true"})
+
+    sweep_id = IdempotencyCache.normalize(data.get("sweepId")) or uuid.uuid4().hex[:12]
+    grid, mode, front = data.get("grid"), data.get("mode") or "product", bool(data.get("front"))
+    if not isinstance(grid, dict) or not grid:
+        return web.json_response({"status": "error", "message": "Missing parameter grid"}, status=400)
+
+    try:
+        if "prompt" not in data:
+            target_sid = find_target_sid(data, request.remote)
+            if not target_sid:
+                return web.json_response({"status": "warning", "message": "No browser client connected"}, status=200)
+            if fair_scheduler:
+                owner = request_owner(data, request.remote)
+                admitted, pending = fair_scheduler.admit(owner)
+                if not admitted:
+                    return quota_refusal(owner, pending)
+                fair_scheduler.assign(target_sid, owner)
+            PromptServer.instance.send_sync("run_button.sweep_request",
+                                            {"sweep_id": sweep_id, "grid": grid, "mode": mode, "front": front}, sid=target_sid)
+            result = {"status": "requested", "sweep_id": sweep_id, "message": f"Sent to {target_sid}"}
+        else:
+            # A browser answering the same request twice must not queue the sweep twice:
+            # the id is claimed before the first await, so concurrent posts cannot both pass
+            if not sweep_tracker.reserve(sweep_id):
+                known = sweep_tracker.snapshot(sweep_id)
+                if known is not None:
+                    return web.json_response(dict(known, status="queued", duplicate=True))
+                return web.json_response({"status": "error", "sweep_id": sweep_id,
+                                          "message": "Sweep is already being queued"}, status=409)
+            try:
+                try:
+                    variants = await asyncio.get_running_loop().run_in_executor(
+                        None, expand_sweep, data["prompt"], grid, mode, SWEEP_MAX_VARIANTS)
+                except SweepError as e:
+                    return web.json_response({"status": "error", "message": str(e)}, status=400)
+                if fair_scheduler:
+                    owner = fair_scheduler.owner_for(data.get("client_id")) if data.get("client_id") else request.remote
+                    admitted, pending = fair_scheduler.admit(owner, len(variants))
+                    if not admitted:
+                        return quota_refusal(owner, pending)
+
+                extra_data = dict(data.get("extra_data") or {})
+                if data.get("workflow"):
+                    extra_data["extra_pnginfo"] = dict(extra_data.get("extra_pnginfo") or {}, workflow=data["workflow"])
+                prompt_ids, error = await enqueue_variants(PromptServer.instance, variants, extra_data,
+                                                           client_id=data.get("client_id"), front=front)
+                if error:
+                    print(f"[RunButton] Sweep {sweep_id} rejected: variant {error['variant'] + 1} is invalid.")
+                    return web.json_response(dict(error, status="error", message=f"Variant {error['variant'] + 1} of {len(variants)} is invalid"), status=400)
+                sweep_tracker.add(sweep_id, prompt_ids, [params for params, _prompt in variants])
+                print(f"[RunButton] Sweep {sweep_id}: queued {len(prompt_ids)} variants.")
+                result = {"status": "queued", "sweep_id": sweep_id, "n": len(prompt_ids), "prompt_ids": prompt_ids}
+            finally:
+                sweep_tracker.release(sweep_id)
+    except Exception as e:
+        print(f"[RunButton] Error starting sweep: {e}")
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+
+    if idempotency_key:
+        TRIGGER_KEYS.put("sweep:" + idempotency_key, result)
+    return web.json_response(result)
+
+async def get_sweep(request):
+    snapshot = sweep_tracker.snapshot(request.match_info["sweep_id"])
+    if snapshot is None:
+        return web.json_response({"status": "error", "message": "Unknown sweep"}, status=404)
+    return web.json_response(snapshot)
+
+# --- API Endpoint: Fair Share ---
+async def get_fair_share(request):
+    # Per-user queue depth, wait times and quotas (binding code or IP)
+    if not fair_scheduler:
+        return web.json_response({"enabled": False, "users": {}})
+    stats = await asyncio.get_running_loop().run_in_executor(None, fair_scheduler.stats)
+    return web.json_response(stats)
+
+# --- API Endpoint: Cached Output Preview ---
+async def get_preview(request):
+    # Serves the small thumbnail of an output from the LRU cache (or builds it on demand)
+    image = {
+        "filename": request.query.get("filename"),
+        "subfolder": request.query.get("subfolder", ""),
+        "type": request.query.get("type", "output"),
+    }
+    try:
+        # Disk read + resize happen off the event loop
+        thumb = await asyncio.get_running_loop().run_in_executor(None, preview_worker.get_thumbnail, image)
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+    if thumb is None:
+        return web.json_response({"status": "error", "message": "Not found"}, status=404)
+    return web.Response(body=thumb[0], content_type="image/png", headers={"Cache-Control": "max-age=3600"})
+
+# --- API Endpoints: Run History ---
+def _int_query(request, name, default, upper):
+    try:
+        return max(1, min(int(request.query.get(name, default)), upper))
+    except ValueError:
+        return default
+
+async def _history_response(fn, *args):
+    try:
+        rows = await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        return web.json_response({"status": "ok", "items": rows})
+    except Exception as e:
+        print(f"[RunButton] History query failed: {e}")
+        return web.json_response({"status": "error", "message": str(e)}, status=500)
+
+async def get_history_runs(request):
+    # ?workflow=<hash>&limit=1000
+    return await _history_response(run_history.recent_runs, request.query.get("workflow"), _int_query(request, "limit", 100, 10000))
+
+async def get_history_run(request):
+    return await _history_response(run_history.run_nodes, request.match_info["prompt_id"])
+
+async def get_history_slow_nodes(request):
+    # ?days=7&limit=20
+    return await _history_response(run_history.slowest_node_classes, _int_query(request, "days", 7, 3650), _int_query(request, "limit", 20, 1000))
+
+async def get_history_workflows(request):
+    return await _history_response(run_history.workflow_stats, _int_query(request, "limit", 100, 10000))
+
+# --- API Endpoint: ETA ---
+async def get_eta(request):
+    # Remaining seconds for the running prompt and for the whole queue, from historical timings
+    return web.json_response(eta_estimator.snapshot())
+
+# --- API Endpoint: Shared System Stats ---
+# RUN_BUTTON_STATS_INTERVAL: seconds between recomputations (default 2)
+# RUN_BUTTON_PUSH_STATS=1: also push changed snapshots to observers
+system_stats = SystemStatsCache(
+    comfy_stats_computer(PromptServer.instance),
+    interval=float(os.environ.get("RUN_BUTTON_STATS_INTERVAL", "2")),
+    publish=publish_to_observers if os.environ.get("RUN_BUTTON_PUSH_STATS") == "1" else None,
+    has_observers=lambda: bool(compact_observers) or bool(get_observer_sids()))
+
+async def get_system_stats(request):
+    # Same body as ComfyUI's /system_stats, computed once per interval for all clients
+    body, etag = await asyncio.get_running_loop().run_in_executor(None, system_stats.get)
+    if body is None:
+        return web.json_response({"status": "error", "message": "System stats unavailable"}, status=503)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type="application/json", headers=headers)
+
 try:
     # Register the API endpoint
     routes = PromptServer.instance.app.router
@@ -176,6 +492,17 @@ try:
     if not route_exists:
         routes.add_post("/run_button/trigger", trigger_run)
         routes.add_post("/run_button/register_binding", register_binding)
+        routes.add_get("/run_button/preview", get_preview)
+        routes.add_get("/run_button/history/runs", get_history_runs)
+        routes.add_get("/run_button/history/runs/{prompt_id}", get_history_run)
+        routes.add_get("/run_button/history/slow_nodes", get_history_slow_nodes)
+        routes.add_get("/run_button/history/workflows", get_history_workflows)
+        routes.add_get("/run_button/eta", get_eta)
+        routes.add_get("/run_button/observer", compact_observers.handle)
+        routes.add_get("/run_button/system_stats", get_system_stats)
+        routes.add_post("/run_button/sweep", start_sweep)
+        routes.add_get("/run_button/sweep/{sweep_id}", get_sweep)
+        routes.add_get("/run_button/fair_share", get_fair_share)
         print("[RunButton] API routes registered.")
     else:
         print("[RunButton] API route /run_button/trigger already exists.")
@@ -0,0 +1,209 @@
+"""
+Browser handshake sidecar (127.0.0.1:56789).
+
+Every ComfyUI tab running js/run_listener.js keeps one websocket open to
+/handshake and pushes its state over it:
+
+    {"type": "register" | "update", "tabId", "clientId", "visible", "focused"}
+
+`register` is sent on connect and whenever api.clientId changes (ComfyUI
+reconnects), `update` on visibility/focus changes. A closed socket removes
+the tab at once, so the desktop always targets a tab that is actually open:
+the most recently focused one. Each tab is told whether it is the current
+target ({"type": "target", "active": bool}).
+
+POST /register (the old one-shot handshake) is still accepted, with CORS
+preflight support, for listeners from older releases.
+
+Only pages served by the configured ComfyUI (comfy_origins) or listed in
+sidecar_allowed_origins may connect or register; any other web page the
+user visits gets 403, so it cannot steer the desktop's trigger target.
+"""
+import json
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer
+
+from ws_util import WebSocketRequestHandler
+
+MAX_LEGACY_TABS = 8
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+
+# Access-Control-Allow-Origin is the request's own origin, once it has been allowed
+CORS_HEADERS = {
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+    # Chrome's Private Network Access preflight for pages served from a LAN address
+    "Access-Control-Allow-Private-Network": "true",
+    "Access-Control-Max-Age": "86400",
+}
+
+
+def comfy_origins(comfy_url):
+    """Web origins of a ComfyUI tab served from comfy_url ("host:port"); loopback names are interchangeable."""
+    base = comfy_url.lower().split("://", 1)[-1].split("/", 1)[0]
+    host, port = base, ""
+    if not base.endswith("]") and ":" in base:
+        host, port = base.rsplit(":", 1)
+    hosts = LOOPBACK_HOSTS if host in LOOPBACK_HOSTS else (host,)
+    suffix = f":{port}" if port else ""
+    return {f"{scheme}://{h}{suffix}" for scheme in ("http", "https") for h in hosts}
+
+
+class BrowserTabRegistry:
+    """Thread-safe. on_change(client_id) is called whenever the selected tab changes."""
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self._tabs = {}  # tab_id -> {"client_id", "visible", "focused", "active_at", "handler"}
+        self._lock = threading.Lock()
+        self._current = None
+
+    def update(self, tab_id, client_id=None, visible=None, focused=None, handler=None):
+        """Returns True if this changed the selected tab (every tab has been told)."""
+        now = time.time()
+        with self._lock:
+            tab = self._tabs.get(tab_id)
+            if tab is None:
+                tab = self._tabs[tab_id] = {"client_id": None, "visible": True, "focused": False,
+                                            "active_at": now, "handler": None}
+            if client_id: tab["client_id"] = client_id
+            if visible is not None: tab["visible"] = bool(visible)
+            if focused is not None: tab["focused"] = bool(focused)
+            if handler is not None: tab["handler"] = handler
+            if tab["focused"] or (tab["visible"] and visible is not None):
+                tab["active_at"] = now
+            self._trim_legacy()
+        return self._reselect()
+
+    def remove(self, tab_id, handler=None):
+        with self._lock:
+            tab = self._tabs.get(tab_id)
+            # A reloaded tab may already be registered again on a new socket
+            if tab and (handler is None or tab["handler"] is handler):
+                del self._tabs[tab_id]
+        self._reselect()
+
+    def _trim_legacy(self):
+        legacy = sorted((t["active_at"], tab_id) for tab_id, t in self._tabs.items() if t["handler"] is None)
+        for _ts, tab_id in legacy[:-MAX_LEGACY_TABS]:
+            del self._tabs[tab_id]
+
+    def select(self):
+        """The tab to target: focused beats visible beats hidden, then most recently active."""
+        with self._lock:
+            live = [(t["focused"], t["visible"], t["active_at"], tab_id)
+                    for tab_id, t in self._tabs.items() if t["client_id"]]
+            return max(live)[3] if live else None
+
+    def _reselect(self):
+        tab_id = self.select()
+        with self._lock:
+            tab = self._tabs.get(tab_id) if tab_id else None
+            client_id = tab["client_id"] if tab else None
+            changed = client_id != self._current
+            self._current = client_id
+            handlers = [(t["handler"], other == tab_id) for other, t in self._tabs.items() if t["handler"]]
+        if not changed:
+            return False
+        logging.info(f"Browser target: {client_id or 'none'} ({len(handlers)} connected tab(s))")
+        for handler, active in handlers:
+            handler.send_text(json.dumps({"type": "target", "active": active}))
+        if self.on_change:
+            self.on_change(client_id)
+        return True
+
+    @property
+    def current(self):
+        return self._current
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tabs)
+
+
+class SidecarHandler(WebSocketRequestHandler):
+    registry = None
+    allowed_origins = ()
+
+    def _check_origin(self):
+        """Requests without an Origin come from local programs, not web pages."""
+        origin = self.headers.get("Origin")
+        if origin is None or origin in self.allowed_origins:
+            return True
+        logging.warning(f"Sidecar: refused page from {origin} (add it to sidecar_allowed_origins if it is ComfyUI)")
+        self._json({"status": "error", "message": "Origin not allowed"}, 403)
+        return False
+
+    def _cors(self):
+        origin = self.headers.get("Origin")
+        if origin is None:
+            return CORS_HEADERS
+        return dict(CORS_HEADERS, **{"Access-Control-Allow-Origin": origin, "Vary": "Origin"})
+
+    def do_OPTIONS(self):
+        if not self._check_origin():
+            return
+        self.send_response(204)
+        for name, value in self._cors().items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if not self._check_origin():
+            return
+        if self.path.split("?", 1)[0] == "/handshake" and self.is_websocket_request():
+            self._handshake()
+        else:
+            self._json({"status": "error", "message": "Not found"}, 404, self._cors())
+
+    def do_POST(self):
+        if not self._check_origin():
+            return
+        if self.path != '/register':
+            self._json({"status": "error", "message": "Not found"}, 404, self._cors())
+            return
+        data = self._read_json_body()
+        if not isinstance(data, dict) or not data.get("clientId"):
+            self._json({"status": "error", "message": "Missing clientId"}, 400, self._cors())
+            return
+        # One-shot registrations have no socket to tell us when the tab goes away
+        self.registry.update(data.get("tabId") or f"legacy:{data['clientId']}", data["clientId"], focused=True)
+        self._json({"status": "ok"}, 200, self._cors())
+
+    def _handshake(self):
+        self.accept_websocket()
+        tab_ids = set()
+
+        def on_text(text):
+            try:
+                msg = json.loads(text)
+            except ValueError:
+                return
+            if not isinstance(msg, dict) or not msg.get("tabId"):
+                return
+            tab_ids.add(msg["tabId"])
+            changed = self.registry.update(msg["tabId"], msg.get("clientId"), msg.get("visible"), msg.get("focused"), handler=self)
+            if msg.get("type") == "register" and not changed:
+                self.send_text(json.dumps({"type": "target", "active": self.registry.current == msg.get("clientId")}))
+
+        try:
+            self.serve_websocket(on_text)
+        finally:
+            for tab_id in tab_ids:
+                self.registry.remove(tab_id, handler=self)
+
+
+def start_sidecar(registry, host="127.0.0.1", port=56789, allowed_origins=()):
+    """
+    Blocks serving the sidecar; one thread per connection so a held handshake never stalls others.
+    allowed_origins is read per request, so a live set may be updated when the ComfyUI address changes.
+    """
+    class Handler(SidecarHandler):
+        pass
+    Handler.registry = registry
+    Handler.allowed_origins = allowed_origins
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
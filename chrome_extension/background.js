@@ -2,10 +2,114 @@
 let socket = null;
 let isConnected = false;
 
-// Store IDs of tabs that have identified themselves as ComfyUI
-const knownComfyTabs = new Set();
+// --- ComfyUI Tab Index ---
+// Confirmed ComfyUI tabs ordered by last focus/activity (most recent = mruTabId).
+// Kept up to date from tab events so picking a target never scans all tabs;
+// the heuristic scan only runs when the index is empty.
+const comfyTabs = new Map(); // tabId -> { origin, title, seen }
+let mruTabId = null;
+let activeTabId = null;
+let persistTimer = null;
+
+function originOf(url) {
+    try { return new URL(url).origin; } catch (e) { return null; }
+}
+
+function indexTab(tab) {
+    // Re-insert so Map order follows recency
+    comfyTabs.delete(tab.id);
+    comfyTabs.set(tab.id, { origin: originOf(tab.url), title: tab.title || "", seen: Date.now() });
+    mruTabId = tab.id;
+    persistIndex();
+}
+
+function touchTab(tabId) {
+    const entry = comfyTabs.get(tabId);
+    if (!entry) return;
+    comfyTabs.delete(tabId);
+    entry.seen = Date.now();
+    comfyTabs.set(tabId, entry);
+    mruTabId = tabId;
+    persistIndex();
+}
+
+function unindexTab(tabId) {
+    if (!comfyTabs.delete(tabId)) return false;
+    if (mruTabId === tabId) {
+        mruTabId = null;
+        for (const id of comfyTabs.keys()) mruTabId = id;
+    }
+    persistIndex();
+    return true;
+}
+
+// The service worker may be suspended; keep the index in session storage so a
+// restart does not fall back to a full scan.
+function persistIndex() {
+    if (persistTimer || !chrome.storage || !chrome.storage.session) return;
+    persistTimer = setTimeout(() => {
+        persistTimer = null;
+        chrome.storage.session.set({ comfyTabs: Array.from(comfyTabs.entries()), activeTabId: activeTabId });
+    }, 500);
+}
+
+if (chrome.storage && chrome.storage.session) {
+    chrome.storage.session.get(["comfyTabs", "activeTabId"]).then((saved) => {
+        for (const [id, entry] of (saved.comfyTabs || [])) {
+            if (!comfyTabs.has(id)) comfyTabs.set(id, entry);
+        }
+        for (const id of comfyTabs.keys()) mruTabId = id;
+        if (activeTabId === null && saved.activeTabId !== undefined) activeTabId = saved.activeTabId;
+    }).catch(() => {});
+}
 let lastTitleHadPercentage = false;
 
+// Tabs whose page hook is actively streaming events: tabId -> last batch time.
+// Title parsing is only a backup, so it is skipped for these tabs.
+const liveHookTabs = new Map();
+const LIVE_HOOK_TTL_MS = 5000;
+
+// --- Outgoing Batcher ---
+// Events for the desktop app are collected for BATCH_MS and sent as one
+// compact { type: "batch", events: [...] } frame. Consecutive progress
+// updates collapse into the latest one and exact repeats are dropped.
+const BATCH_MS = 50;
+let outgoing = [];
+let batchTimer = null;
+let lastSentProgress = null;
+
+function queueForDesktop(events) {
+    for (const ev of events) {
+        const last = outgoing[outgoing.length - 1];
+        if (ev.t === "progress" && last && last.t === "progress") {
+            outgoing[outgoing.length - 1] = ev;
+        } else {
+            outgoing.push(ev);
+        }
+    }
+    if (!batchTimer) batchTimer = setTimeout(flushToDesktop, BATCH_MS);
+}
+
+function flushToDesktop() {
+    batchTimer = null;
+    const events = [];
+    for (const ev of outgoing) {
+        if (ev.t === "progress") {
+            const key = JSON.stringify(ev);
+            if (key === lastSentProgress) continue;
+            lastSentProgress = key;
+        }
+        events.push(ev);
+    }
+    outgoing = [];
+    if (!events.length || !isConnected || !socket || socket.readyState !== WebSocket.OPEN) return;
+    try {
+        socket.send(JSON.stringify({ type: "batch", events: events }));
+    } catch (e) {
+        console.error("[RunButton Ext] Failed to send batch:", e);
+    }
+}
+
 // Helper to send logs to Python
 function remoteLog(level, message) {
     if (isConnected && socket && socket.readyState === WebSocket.OPEN) {
@@ -22,27 +126,59 @@ function remoteLog(level, message) {
 
 // Clean up closed tabs
 chrome.tabs.onRemoved.addListener((tabId) => {
-    if (knownComfyTabs.has(tabId)) {
-        knownComfyTabs.delete(tabId);
+    liveHookTabs.delete(tabId);
+    if (activeTabId === tabId) activeTabId = null;
+    if (unindexTab(tabId)) {
         remoteLog("info", `Tab ${tabId} closed. Removed from known list.`);
     }
 });
 
+// Track focus so the active tab is known without querying
+chrome.tabs.onActivated.addListener((activeInfo) => {
+    activeTabId = activeInfo.tabId;
+    if (comfyTabs.has(activeInfo.tabId)) {
+        touchTab(activeInfo.tabId);
+        return;
+    }
+    chrome.tabs.get(activeInfo.tabId).then((tab) => {
+        if (isComfyHeuristic(tab)) indexTab(tab);
+    }).catch(() => {});
+});
+
+chrome.windows.onFocusChanged.addListener((windowId) => {
+    if (windowId === chrome.windows.WINDOW_ID_NONE) return;
+    chrome.tabs.query({ active: true, windowId: windowId }).then((tabs) => {
+        if (!tabs[0]) return;
+        activeTabId = tabs[0].id;
+        touchTab(activeTabId);
+    }).catch(() => {});
+});
+
 // Monitor Title Changes for Progress (Backup Strategy)
 chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
     // 1. Check if this is a ComfyUI tab (Known or Heuristic)
-    // Always re-evaluate on update (especially if it was just loaded)
-    if (isComfyHeuristic(tab)) {
-        if (!knownComfyTabs.has(tabId)) {
-             knownComfyTabs.add(tabId);
-             remoteLog("info", `Detected ComfyUI via Heuristic on update: ${tabId} (${tab.title})`);
+    // Only re-evaluate when something the heuristic looks at has changed
+    if (changeInfo.url || changeInfo.title || changeInfo.status === "complete") {
+        const entry = comfyTabs.get(tabId);
+        if (isComfyHeuristic(tab)) {
+            if (!entry) {
+                 indexTab(tab);
+                 remoteLog("info", `Detected ComfyUI via Heuristic on update: ${tabId} (${tab.title})`);
+            } else {
+                 entry.title = tab.title || entry.title;
+            }
+        } else if (entry && changeInfo.url && originOf(changeInfo.url) !== entry.origin) {
+            // Navigated away from ComfyUI
+            unindexTab(tabId);
         }
     }
     
     if (changeInfo.title) {
-        let isComfy = knownComfyTabs.has(tabId);
+        let isComfy = comfyTabs.has(tabId);
+        const hookSeen = liveHookTabs.get(tabId);
+        const hookIsLive = hookSeen && Date.now() - hookSeen < LIVE_HOOK_TTL_MS;
 
-        if (isComfy && isConnected && socket) {
+        if (isComfy && !hookIsLive && isConnected && socket) {
             // Regex to find percentage: 50%, [50%], (50%)
             const match = changeInfo.title.match(/(\d+)%/);
             if (match) {
@@ -50,12 +186,7 @@ chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
                 const pct = parseInt(match[1]);
                 if (!isNaN(pct)) {
                     // Send progress event
-                    try {
-                        socket.send(JSON.stringify({
-                            type: "progress",
-                            data: { value: pct, max: 100 }
-                        }));
-                    } catch(e) {}
+                    queueForDesktop([{ t: "progress", v: pct, m: 100 }]);
                 }
             } else {
                  // Title does NOT have percentage.
@@ -64,16 +195,7 @@ chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
                      console.log("[RunButton Ext] Title implies done (percentage gone)");
                      lastTitleHadPercentage = false;
                      // Send completion signal
-                      try {
-                         socket.send(JSON.stringify({
-                             type: "progress",
-                             data: { value: 100, max: 100 }
-                         }));
-                         socket.send(JSON.stringify({
-                             type: "executing",
-                             data: { node: null }
-                         }));
-                     } catch(e) {}
+                     queueForDesktop([{ t: "progress", v: 100, m: 100 }, { t: "executing", n: null }]);
                  }
             }
         }
@@ -117,16 +239,7 @@ function connect() {
                     stopComfyUI();
                 } else if (msg.type === 'execution_success') {
                     // Force complete progress
-                    try {
-                        socket.send(JSON.stringify({
-                            type: "progress",
-                            data: { value: 100, max: 100 }
-                        }));
-                        socket.send(JSON.stringify({
-                            type: "executing",
-                            data: { node: null }
-                        }));
-                    } catch(e) {}
+                    queueForDesktop([{ t: "progress", v: 100, m: 100 }, { t: "executing", n: null }]);
                 }
             } catch (e) {
                 console.error(e);
@@ -162,9 +275,33 @@ async function triggerComfyUI() {
 
     // Trigger
     remoteLog("info", `Targeting Tab: ${targetTab.id} (${targetTab.title})`);
+    if (await runPageCommand(targetTab, "queue")) return;
     injectTriggerScript(targetTab);
 }
 
+// Sends a command to the handler content.js installed in the page.
+// Returns true if it was handled; false means the caller should fall back to injection.
+async function runPageCommand(tab, command) {
+    let res;
+    try {
+        res = await chrome.tabs.sendMessage(tab.id, { type: "runbutton-command", command: command });
+    } catch (e) {
+        res = { ok: false, reason: "no_content_script" };
+    }
+    res = res || { ok: false, reason: "no_response" };
+    if (res.ok) {
+        remoteLog("info", `Page handler ${command}: ${res.via}`);
+        return true;
+    }
+    if (res.reason === "timeout") {
+        // The command may still run late; injecting now could double-submit.
+        remoteLog("warn", `Page handler ${command} timed out, not retrying.`);
+        return true;
+    }
+    remoteLog("info", `Page handler unavailable for ${command} (${res.reason}), falling back to script injection.`);
+    return false;
+}
+
 async function stopComfyUI() {
     let targetTab = await findTargetTab();
     if (!targetTab) {
@@ -175,6 +312,11 @@ async function stopComfyUI() {
     console.log("[RunButton Ext] Sending STOP to tab:", targetTab.id, targetTab.title);
     remoteLog("info", `Sending STOP to Tab: ${targetTab.id}`);
     
+    if (await runPageCommand(targetTab, "interrupt")) return;
+    injectStopScript(targetTab);
+}
+
+function injectStopScript(targetTab) {
     chrome.scripting.executeScript({
         target: { tabId: targetTab.id },
         world: 'MAIN', // Execute in Main World to access window.app
@@ -199,41 +341,29 @@ async function stopComfyUI() {
 }
 
 async function findTargetTab() {
-    let targetTab = null;
-    const activeTabs = await chrome.tabs.query({active: true, currentWindow: true});
-    const activeTab = activeTabs[0];
-
-    // Strategy 1 & 2: Active Tab
-    if (activeTab) {
-        if (knownComfyTabs.has(activeTab.id)) {
-            targetTab = activeTab;
-        } else if (isComfyHeuristic(activeTab)) {
-            targetTab = activeTab;
-        }
+    // Fast path: answer from the index. Returns a minimal { id, title } tab.
+    // Strategy 1: Active tab, if it is a known ComfyUI tab
+    if (activeTabId !== null && comfyTabs.has(activeTabId)) {
+        return { id: activeTabId, title: comfyTabs.get(activeTabId).title };
     }
 
-    // Strategy 3: Known Comfy Tabs (Background)
-    if (!targetTab && knownComfyTabs.size > 0) {
-        const ids = Array.from(knownComfyTabs);
-        try {
-            const tabs = await chrome.tabs.get(ids[ids.length - 1]);
-            targetTab = tabs;
-        } catch(e) {
-            knownComfyTabs.delete(ids[ids.length - 1]);
-        }
+    // Strategy 2: Most recently used ComfyUI tab
+    if (mruTabId !== null && comfyTabs.has(mruTabId)) {
+        return { id: mruTabId, title: comfyTabs.get(mruTabId).title };
     }
 
-    // Strategy 4: Search All (Fallback)
-    if (!targetTab) {
-        const allTabs = await chrome.tabs.query({});
-        for (const tab of allTabs) {
-            if (isComfyHeuristic(tab)) {
-                targetTab = tab;
-                break;
-            }
-        }
+    // Strategy 3: Cache miss -> scan all tabs once and index every match
+    remoteLog("info", "Tab index empty, scanning all tabs for ComfyUI...");
+    const allTabs = await chrome.tabs.query({});
+    const matches = allTabs.filter(isComfyHeuristic);
+    // Oldest first so the most recently accessed one ends up as MRU
+    matches.sort((a, b) => (a.lastAccessed || 0) - (b.lastAccessed || 0));
+    for (const tab of matches) {
+        indexTab(tab);
+        if (tab.active && tab.highlighted) activeTabId = tab.id;
     }
-    return targetTab;
+    const active = matches.find(t => t.id === activeTabId);
+    return active || matches[matches.length - 1] || null;
 }
 
 function isComfyHeuristic(tab) {
@@ -312,27 +442,28 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
         // Register ComfyUI Tabs
         if (request.type === "comfy-event" && request.payload.type === "comfy-detected") {
             if (sender.tab && sender.tab.id) {
-                if (!knownComfyTabs.has(sender.tab.id)) {
+                if (!comfyTabs.has(sender.tab.id)) {
                     console.log(`[RunButton Ext] Registered ComfyUI Tab: ${sender.tab.id} (${sender.tab.title})`);
-                    knownComfyTabs.add(sender.tab.id);
+                    indexTab(sender.tab);
                 }
             }
             return;
         }
 
-        if (request.type === "comfy-event" && isConnected && socket) {
-            // Forward to Desktop App via WebSocket
-            // We wrap it in a JSON structure
-            // { type: "status" | "progress" ..., data: ... }
-            try {
-                // The python backend expects: { type: "type", data: {} }
-                const msg = {
-                    type: request.payload.type,
-                    data: request.payload.data
-                };
-                socket.send(JSON.stringify(msg));
-            } catch (e) {
-                console.error("[RunButton Ext] Failed to forward message:", e);
+        // Batched, already-compacted events from the page hook
+        if (request.type === "comfy-batch") {
+            if (sender.tab && sender.tab.id) {
+                liveHookTabs.set(sender.tab.id, Date.now());
+                if (!comfyTabs.has(sender.tab.id)) indexTab(sender.tab);
             }
+            if (isConnected && socket && Array.isArray(request.events)) {
+                queueForDesktop(request.events);
+            }
+            return;
+        }
+
+        if (request.type === "comfy-event" && isConnected && socket) {
+            // Forward to Desktop App via the batcher; raw payload travels in 'd'
+            queueForDesktop([{ t: request.payload.type, d: request.payload.data }]);
         }
     });
\ No newline at end of file
@@ -40,41 +40,87 @@
         // Stop DOM check after 60s
         setTimeout(() => clearInterval(checkDom), 60000);
 
-        function hookComfy(api) {
-            // Forward events to content script via postMessage
-            console.log("[RunButton Page] Hooking API events: status, progress, executing...");
-            
-            api.addEventListener("status", (e) => {
-                // console.log("[RunButton Page] Event: status", e.detail);
-                window.postMessage({ source: "runbutton-page", type: "status", data: e.detail }, "*");
-            });
+        // --- Event Batching ---
+        // Events are reduced to the compact schema the desktop app uses
+        // ({t, p, n, v, m, q}), consecutive progress/status updates are coalesced
+        // and identical repeats dropped. The pending batch is flushed once per
+        // animation frame (or every FLUSH_MS when the tab is hidden and rAF is paused).
+        const FLUSH_MS = 100;
+        let pending = [];
+        let flushScheduled = false;
+        const lastSent = {};
 
-            api.addEventListener("progress", (e) => {
-                // console.log("[RunButton Page] Event: progress", e.detail);
-                window.postMessage({ source: "runbutton-page", type: "progress", data: e.detail }, "*");
-            });
+        function compactEvent(type, detail) {
+            const ev = { t: type };
+            if (type === "status") {
+                const info = (detail && (detail.exec_info || (detail.status && detail.status.exec_info))) || {};
+                ev.q = info.queue_remaining || 0;
+                return ev;
+            }
+            if (detail === null || typeof detail !== "object") {
+                // 'executing' carries the bare node id (or null when the queue is done)
+                if (type === "executing") ev.n = detail === undefined ? null : detail;
+                return ev;
+            }
+            if (detail.prompt_id !== undefined) ev.p = detail.prompt_id;
+            if (detail.node !== undefined) ev.n = detail.node;
+            else if (detail.node_id !== undefined) ev.n = detail.node_id;
+            if (detail.value !== undefined) ev.v = detail.value;
+            if (detail.max !== undefined) ev.m = detail.max;
+            return ev;
+        }
 
-            api.addEventListener("execution_start", (e) => {
-                // console.log("[RunButton Page] Event: execution_start", e.detail);
-                window.postMessage({ source: "runbutton-page", type: "execution_start", data: e.detail }, "*");
-            });
+        function queueEvent(type, detail) {
+            const ev = compactEvent(type, detail);
+            const last = pending[pending.length - 1];
+            if (last && last.t === ev.t && (ev.t === "progress" || ev.t === "status")) {
+                pending[pending.length - 1] = ev; // Coalesce: only the latest value matters
+            } else {
+                pending.push(ev);
+            }
+            scheduleFlush();
+        }
+
+        function scheduleFlush() {
+            if (flushScheduled) return;
+            flushScheduled = true;
+            if (document.visibilityState === "visible") {
+                requestAnimationFrame(flush);
+            } else {
+                setTimeout(flush, FLUSH_MS);
+            }
+        }
+
+        function flush() {
+            flushScheduled = false;
+            const events = [];
+            for (const ev of pending) {
+                const key = JSON.stringify(ev);
+                if ((ev.t === "progress" || ev.t === "status") && lastSent[ev.t] === key) continue;
+                lastSent[ev.t] = key;
+                events.push(ev);
+            }
+            pending = [];
+            if (events.length) {
+                window.postMessage({ source: "runbutton-page", type: "batch", data: events }, "*");
+            }
+        }
+
+        function hookComfy(api) {
+            // Forward events to content script in batches
+            console.log("[RunButton Page] Hooking API events: status, progress, executing...");
             
-            api.addEventListener("execution_error", (e) => {
-                window.postMessage({ source: "runbutton-page", type: "execution_error", data: e.detail }, "*");
-            });
+            for (const type of ["status", "progress", "execution_start", "execution_error", "execution_interrupted", "execution_cached"]) {
+                api.addEventListener(type, (e) => queueEvent(type, e.detail));
+            }
 
             api.addEventListener("executing", (e) => {
-                // console.log("[RunButton Page] Event: executing", e.detail);
-                window.postMessage({ source: "runbutton-page", type: "executing", data: e.detail }, "*");
+                queueEvent("executing", e.detail);
                 
                 // If e.detail is null, it means execution finished for the queue batch
                 if (e.detail === null) {
                      // Force update status to idle/done
-                     window.postMessage({ 
-                         source: "runbutton-page", 
-                         type: "status", 
-                         data: { status: { exec_info: { queue_remaining: 0 } } } 
-                     }, "*");
+                     queueEvent("status", { exec_info: { queue_remaining: 0 } });
                 }
             });
             
@@ -85,13 +131,10 @@
             setInterval(() => {
                 if (window.app && window.app.ui) {
                      // 1. Queue Status
+                     // Unchanged values are dropped by the batcher, so this costs nothing when idle.
                      const q = window.app.ui.lastQueueRemaining;
                      if (typeof q === 'number') {
-                          window.postMessage({ 
-                              source: "runbutton-page", 
-                              type: "status", 
-                              data: { status: { exec_info: { queue_remaining: q } } } 
-                          }, "*");
+                          queueEvent("status", { exec_info: { queue_remaining: q } });
                      }
                      
                      // 2. Progress Status (Backup for title monitoring or direct access)
@@ -101,6 +144,73 @@
                 }
             }, 1000);
         }
+
+        // --- Command Handler ---
+        // Installed once per page so a trigger/stop from the desktop app is a
+        // single postMessage instead of a chrome.scripting injection + DOM scan.
+        // Entry points are resolved on first use and cached; API calls are
+        // preferred, buttons are a fallback (re-resolved if they leave the DOM).
+        const entryPoints = { queue: null, interrupt: null };
+
+        function findButton(texts, selectors) {
+            for (const sel of selectors) {
+                const el = document.querySelector(sel);
+                if (el) return el;
+            }
+            const menuBtns = document.querySelectorAll(".comfy-menu-bg .comfy-list-button, button");
+            for (const b of menuBtns) {
+                if (texts.some(t => b.innerText && b.innerText.includes(t))) return b;
+            }
+            return null;
+        }
+
+        function resolveEntryPoint(command) {
+            const cached = entryPoints[command];
+            if (cached && (cached.kind === "api" || cached.el.isConnected)) return cached;
+
+            const app = window.app;
+            let resolved = null;
+            if (command === "queue") {
+                if (app && typeof app.queuePrompt === "function") {
+                    resolved = { kind: "api", name: "app.queuePrompt", run: () => app.queuePrompt(0) };
+                } else {
+                    const el = findButton(["Queue Prompt"], ["#queue-button"]);
+                    if (el) resolved = { kind: "dom", name: "button", el: el, run: () => el.click() };
+                }
+            } else if (command === "interrupt") {
+                if (app && app.api && typeof app.api.interrupt === "function") {
+                    resolved = { kind: "api", name: "api.interrupt", run: () => app.api.interrupt() };
+                } else {
+                    const el = findButton(["Cancel", "Interrupt"], []);
+                    if (el) resolved = { kind: "dom", name: "button", el: el, run: () => el.click() };
+                }
+            }
+            entryPoints[command] = resolved;
+            return resolved;
+        }
+
+        window.addEventListener("message", (event) => {
+            if (event.source !== window || !event.data || event.data.source !== "runbutton-ext") return;
+            const { id, command } = event.data;
+            let result;
+            try {
+                const entry = resolveEntryPoint(command);
+                if (entry) {
+                    const ret = entry.run();
+                    if (ret && typeof ret.catch === "function") {
+                        ret.catch((e) => console.error("[RunButton Page] " + entry.name + " failed:", e));
+                    }
+                    result = { ok: true, via: entry.name };
+                } else {
+                    result = { ok: false, reason: "not_found" };
+                }
+            } catch (e) {
+                entryPoints[command] = null;
+                result = { ok: false, reason: String(e && e.message || e) };
+            }
+            window.postMessage({ source: "runbutton-page", type: "command-result", data: Object.assign({ id: id }, result) }, "*");
+        });
+        window.postMessage({ source: "runbutton-page", type: "handler-ready", data: {} }, "*");
     })();
     `;
     
@@ -108,13 +218,53 @@
     (document.head || document.documentElement).appendChild(script);
     script.remove();
 
-    // 3. Listen for messages from the Page Context
+    // 3. Relay commands from the Background Script to the page handler
+    let handlerReady = false;
+    let nextCommandId = 1;
+    const pendingCommands = new Map(); // id -> sendResponse
+
+    chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
+        if (request.type !== "runbutton-command") return;
+        if (!handlerReady) {
+            sendResponse({ ok: false, reason: "no_handler" });
+            return;
+        }
+        const id = nextCommandId++;
+        pendingCommands.set(id, sendResponse);
+        setTimeout(() => {
+            const respond = pendingCommands.get(id);
+            if (respond) {
+                pendingCommands.delete(id);
+                respond({ ok: false, reason: "timeout" });
+            }
+        }, 1000);
+        window.postMessage({ source: "runbutton-ext", id: id, command: request.command }, "*");
+        return true; // Respond asynchronously
+    });
+
+    // 4. Listen for messages from the Page Context
     window.addEventListener("message", (event) => {
         // We only accept messages from ourselves
         if (event.source !== window) return;
         if (event.data && event.data.source === "runbutton-page") {
+            if (event.data.type === "handler-ready") {
+                handlerReady = true;
+                return;
+            }
+            if (event.data.type === "command-result") {
+                const respond = pendingCommands.get(event.data.data.id);
+                if (respond) {
+                    pendingCommands.delete(event.data.data.id);
+                    respond(event.data.data);
+                }
+                return;
+            }
             // Forward to Background Script
             try {
+                if (event.data.type === "batch") {
+                    chrome.runtime.sendMessage({ type: "comfy-batch", events: event.data.data });
+                    return;
+                }
                 chrome.runtime.sendMessage({
                     type: "comfy-event",
                     payload: {
@@ -0,0 +1,208 @@
+"""
+ETA prediction from historical node timings.
+
+The estimator runs as a RunHistory listener (on the history writer thread),
+so loading a workflow's timing model from SQLite never touches the executor.
+Per workflow it keeps, for each node id, an average duration and how often
+the node was served from cache. While a prompt runs we maintain:
+
+  pending   expected seconds of nodes that have not started yet
+  current   expected seconds of the node that is executing
+
+Each event adjusts these sums in O(1) (execution_cached in O(#nodes cached)),
+so the ETA is always `pending + remaining(current)`. The queue ETA is the sum
+of expected run times of queued prompts, recomputed only when the queue changes.
+"""
+import time
+import threading
+
+from .run_history import workflow_hash
+
+ETA_EVENT = "run_button.eta"
+EMA_ALPHA = 0.3
+
+
+class WorkflowModel:
+    def __init__(self):
+        self.nodes = {}   # node_id -> [avg_duration, samples, cached_count]
+        self.runs = 0
+        self.avg_total = 0.0
+
+    def expected(self, node_id):
+        stats = self.nodes.get(node_id)
+        if not stats or not stats[1]:
+            return 0.0
+        avg, samples, cached = stats
+        return avg * (1.0 - cached / samples)
+
+    def expected_total(self):
+        if self.avg_total:
+            return self.avg_total
+        return sum(self.expected(n) for n in self.nodes)
+
+    def update(self, run):
+        """Folds a finished run into the model (exponential moving average)."""
+        for node_id, _class_type, _started, duration, cached in run["nodes"]:
+            stats = self.nodes.setdefault(node_id, [duration, 0, 0])
+            if cached:
+                stats[2] += 1
+            else:
+                stats[0] = duration if stats[1] == stats[2] else stats[0] + EMA_ALPHA * (duration - stats[0])
+            stats[1] += 1
+        total = run["ended"] - run["started"]
+        self.avg_total = total if not self.runs else self.avg_total + EMA_ALPHA * (total - self.avg_total)
+        self.runs += 1
+
+
+class EtaEstimator:
+    """
+    history: RunHistory (used to load models and as the event source)
+    queued_prompts(): list of (prompt_id, prompt) waiting in the queue
+    publish(snapshot): called at most every `publish_interval` seconds, or on state changes
+    """
+    def __init__(self, history, queued_prompts=None, publish=None, publish_interval=1.0):
+        self.history = history
+        self.queued_prompts = queued_prompts
+        self.publish = publish
+        self.publish_interval = publish_interval
+        self.models = {}
+        self._hash_cache = {}     # prompt_id -> workflow hash of queued prompts
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+        self._reset()
+        self.queue_seconds = 0.0
+        self.queue_known = 0
+        history.listeners.append(self.on_event)
+
+    def _reset(self):
+        self.prompt_id = None
+        self.model = None
+        self.pending = 0.0
+        self.current = 0.0
+        self.current_started = 0.0
+        self.current_fraction = 0.0
+        self.started = 0.0
+
+    def _model(self, whash):
+        model = self.models.get(whash)
+        if model is None:
+            model = self.models[whash] = self._load_model(whash)
+        return model
+
+    def _load_model(self, whash):
+        model = WorkflowModel()
+        if not whash:
+            return model
+        rows = self.history._query(
+            "SELECT n.node_id, AVG(CASE WHEN n.cached = 0 THEN n.duration END) AS avg, COUNT(*) AS samples, "
+            "SUM(n.cached) AS cached FROM node_runs n JOIN (SELECT id FROM runs WHERE workflow_hash = ? AND outcome = 'success' "
+            "ORDER BY started DESC LIMIT 50) r ON n.run_id = r.id GROUP BY n.node_id", (whash,))
+        for row in rows:
+            model.nodes[row["node_id"]] = [row["avg"] or 0.0, row["samples"], row["cached"] or 0]
+        stats = self.history._query("SELECT runs, total_duration FROM workflow_stats WHERE workflow_hash = ?", (whash,))
+        if stats and stats[0]["runs"]:
+            model.runs = stats[0]["runs"]
+            model.avg_total = stats[0]["total_duration"] / stats[0]["runs"]
+        return model
+
+    # --- Event handling (history writer thread) ---
+    def on_event(self, event, data, ts, run):
+        with self._lock:
+            if event == "status":
+                self._refresh_queue()
+                self._publish(ts, force=True)
+                return
+
+            if event == "execution_start" and run:
+                self._reset()
+                self.prompt_id = run["prompt_id"]
+                self.started = ts
+                self.model = self._model(run["workflow_hash"])
+                if self.model.nodes:
+                    self.pending = sum(self.model.expected(n) for n in run["classes"])
+                else:
+                    self.pending = self.model.expected_total()
+                self._hash_cache.pop(self.prompt_id, None)
+                self._refresh_queue()
+                self._publish(ts, force=True)
+                return
+
+            if run is not None and run.get("outcome"):
+                # The run just finished: learn from it
+                if run["outcome"] == "success" and run.get("workflow_hash"):
+                    self._model(run["workflow_hash"]).update(run)
+                self._reset()
+                self._publish(ts, force=True)
+                return
+
+            if self.model is None or run is None or run["prompt_id"] != self.prompt_id:
+                return
+
+            if event == "execution_cached":
+                for node_id in data.get("nodes") or []:
+                    self.pending -= self.model.expected(str(node_id))
+            elif event == "executing":
+                node_id = str(data.get("node"))
+                self.current = self.model.expected(node_id)
+                self.pending -= self.current
+                self.current_started = ts
+                self.current_fraction = 0.0
+            elif event == "progress":
+                max_val = data.get("max") or 0
+                self.current_fraction = (data.get("value", 0) / max_val) if max_val else 0.0
+            self.pending = max(0.0, self.pending)
+            self._publish(ts, force=event == "executing")
+
+    def _refresh_queue(self):
+        if not self.queued_prompts:
+            return
+        total, known, seen = 0.0, 0, set()
+        for prompt_id, prompt in self.queued_prompts():
+            seen.add(prompt_id)
+            whash = self._hash_cache.get(prompt_id)
+            if whash is None:
+                whash = self._hash_cache[prompt_id] = workflow_hash(prompt)
+            model = self._model(whash)
+            if model.runs:
+                total += model.expected_total()
+                known += 1
+        for prompt_id in list(self._hash_cache):
+            if prompt_id not in seen:
+                del self._hash_cache[prompt_id]
+        self.queue_seconds = total
+        self.queue_known = known
+
+    # --- Output ---
+    def current_remaining(self, now=None):
+        if self.prompt_id is None:
+            return None
+        now = now or time.time()
+        elapsed = now - self.current_started if self.current_started else 0.0
+        if self.current_fraction > 0.02:
+            # Sampler-style nodes report steps: extrapolate from the observed rate
+            current_left = elapsed * (1.0 - self.current_fraction) / self.current_fraction
+        else:
+            current_left = max(0.0, self.current - elapsed)
+        return self.pending + current_left
+
+    def snapshot(self, now=None):
+        now = now or time.time()
+        remaining = self.current_remaining(now)
+        return {
+            "prompt_id": self.prompt_id,
+            "remaining": round(remaining, 1) if remaining is not None else None,
+            "elapsed": round(now - self.started, 1) if self.prompt_id else None,
+            "samples": self.model.runs if self.model else 0,
+            "queue_remaining": round(self.queue_seconds + (remaining or 0.0), 1),
+            "queue_known": self.queue_known,
+            "ts": now,
+        }
+
+    def _publish(self, ts, force=False):
+        if not self.publish or (not force and ts - self._last_publish < self.publish_interval):
+            return
+        self._last_publish = ts
+        try:
+            self.publish(self.snapshot(ts))
+        except Exception as e:
+            print(f"[RunButton] ETA publish failed: {e}")
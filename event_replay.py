@@ -0,0 +1,314 @@
+"""
+Event stream recorder and time-accurate replayer.
+
+Recordings are gzip-compressed JSON lines:
+    {"format": "run_button_events", "version": 1, "started": <unix time>}
+    [<ms since start>, "ws" | "ext", "<raw message text>"]
+"ws" is the observer websocket stream from ComfyUI, "ext" the Chrome
+extension stream on port 56790. Messages are stored verbatim so a replay
+exercises exactly the same parsing and rendering code.
+
+Usage:
+    python event_replay.py record out.rbrec --url 127.0.0.1:8188
+    python event_replay.py replay out.rbrec --target app --speed 10 [--profile app.prof]
+    python event_replay.py replay out.rbrec --target server --port 8288 --speed 1
+    python event_replay.py replay out.rbrec --target ext --speed 0     (0 = as fast as possible)
+    python event_replay.py replay out.rbrec --target engine --speed 0 --profile engine.prof
+
+`--target app` feeds the recording straight into an in-process FloatApp
+(`--target engine`: the same without Tk, see run_engine.py);
+`--target server` pretends to be ComfyUI (point the app at 127.0.0.1:<port>);
+`--target ext` pretends to be the Chrome extension and connects to the app.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import base64
+import socket
+import argparse
+import threading
+
+from ws_util import ws_accept_key, ws_frame
+
+FORMAT_NAME = "run_button_events"
+FLUSH_INTERVAL = 1.0  # seconds; a hard kill loses at most this much of the recording
+
+
+# --- Recording ---
+
+class EventRecorder:
+    """
+    Thread-safe writer; record() may be called from any socket thread.
+    The gzip stream is sync-flushed every FLUSH_INTERVAL, so a recording left
+    by a killed process (os._exit, kill_all.bat) stays readable up to that point.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        self._t0 = time.monotonic()
+        self._dirty = False
+        self.count = 0
+        self._file.write(json.dumps({"format": FORMAT_NAME, "version": 1, "started": time.time()}) + "\n")
+        self._closed = threading.Event()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def record(self, source, message):
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", "replace")
+        line = json.dumps([round((time.monotonic() - self._t0) * 1000.0, 1), source, message], separators=(",", ":"))
+        with self._lock:
+            if self._file:
+                self._file.write(line + "\n")
+                self._dirty = True
+                self.count += 1
+
+    def _flush_loop(self):
+        while not self._closed.wait(FLUSH_INTERVAL):
+            with self._lock:
+                if self._file and self._dirty:
+                    self._file.flush()
+                    self._dirty = False
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(path, sources=None):
+    """
+    Yields (ms, source, message) in recorded order.
+    A truncated recording (process killed while recording) ends at the last complete flush.
+    """
+    count = 0
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline() or "{}")
+            if header.get("format") != FORMAT_NAME:
+                raise ValueError(f"{path} is not a Run Button event recording")
+            for line in f:
+                if not line.strip():
+                    continue
+                ms, source, message = json.loads(line)
+                count += 1
+                if sources is None or source in sources:
+                    yield ms, source, message
+        except (EOFError, zlib.error):
+            print(f"[Replay] {path} is truncated, stopping after {count} events")
+
+
+class Replayer:
+    """speed: 1.0 = real time, N = N times faster, 0 = no waiting at all."""
+    def __init__(self, path, speed=1.0, sources=None):
+        self.path = path
+        self.speed = speed
+        self.sources = sources
+
+    def play(self, sink):
+        """Calls sink(source, message) on schedule. Returns replay statistics."""
+        start = time.monotonic()
+        count, max_lag = 0, 0.0
+        for ms, source, message in read_recording(self.path, self.sources):
+            if self.speed > 0:
+                due = start + ms / 1000.0 / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            sink(source, message)
+            count += 1
+        elapsed = time.monotonic() - start
+        return {
+            "events": count,
+            "seconds": round(elapsed, 3),
+            "events_per_second": round(count / elapsed, 1) if elapsed > 0 else None,
+            "max_lag_ms": round(max_lag * 1000.0, 1),
+        }
+
+
+# --- Replay Targets ---
+
+def _read_http_request(conn):
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            return None, {}, b""
+        data += chunk
+    head, _, body = data.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return lines[0], headers, body
+
+
+class FakeComfyServer:
+    """
+    Serves just enough of plain ComfyUI for FloatApp: /system_stats, the trigger
+    and interrupt endpoints, and /ws, which streams the recorded "ws" messages to
+    every client that connects. Everything else (including the negotiated
+    /run_button/observer and /run_button/system_stats) is 404, so the app uses
+    its fallbacks and decodes the recorded JSON as it was captured.
+    """
+    def __init__(self, replayer, host="127.0.0.1", port=8288):
+        self.replayer = replayer
+        self.host, self.port = host, port
+
+    def serve_forever(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        server.listen(16)
+        print(f"Fake ComfyUI listening on {self.host}:{self.port}")
+        while True:
+            conn, _addr = server.accept()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            request_line, headers, _body = _read_http_request(conn)
+            if not request_line:
+                return
+            method, _, rest = request_line.partition(" ")
+            path = rest.split(" ", 1)[0].split("?", 1)[0]
+            if headers.get("upgrade", "").lower() == "websocket" and path == "/ws":
+                self._stream(conn, headers)
+                return
+            status, body = "200 OK", {"status": "ok"}
+            if method == "GET" and path == "/system_stats":
+                body = {"system": {"os": "replay"}, "devices": []}
+            elif method == "POST" and path == "/run_button/trigger":
+                body = {"status": "triggered", "message": "Replay server"}
+            elif not (method == "POST" and path == "/interrupt"):
+                status, body = "404 Not Found", {"status": "error", "message": "Not found"}
+            payload = json.dumps(body).encode()
+            conn.sendall(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n".encode()
+                         + f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+        except OSError:
+            pass
+        finally:
+            try: conn.close()
+            except OSError: pass
+
+    def _stream(self, conn, headers):
+        conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {ws_accept_key(headers.get('sec-websocket-key', ''))}\r\n\r\n").encode())
+        stats = self.replayer.play(lambda source, message: conn.sendall(ws_frame(message)))
+        print(f"Replay to client finished: {stats}")
+        # Keep the socket open so the client stays "online" after the replay
+        while conn.recv(4096):
+            pass
+
+
+class FakeExtensionClient:
+    """Connects to FloatApp's extension server (56790) and sends the recorded "ext" messages."""
+    def __init__(self, replayer, host="127.0.0.1", port=56790):
+        self.replayer = replayer
+        self.host, self.port = host, port
+
+    def run(self):
+        conn = socket.create_connection((self.host, self.port))
+        key = base64.b64encode(os.urandom(16)).decode()
+        conn.sendall((f"GET / HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nUpgrade: websocket\r\n"
+                      f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        conn.recv(1024)
+        try:
+            return self.replayer.play(lambda source, message: conn.sendall(ws_frame(message, mask=True)))
+        finally:
+            conn.close()
+
+
+def replay_into_app(replayer, profile_path=None, headless=False):
+    """
+    Runs a FloatApp (or a headless RunEngine) in this process and feeds the recording directly into its handlers.
+    The app is built offline (live=False): no ComfyUI connection, so only recorded events reach it.
+    """
+    if headless:
+        import run_engine
+        app = run_engine.RunEngine(run_engine.HeadlessLoop(), hotkeys=False, live=False)
+    else:
+        import float_run
+        app = float_run.FloatApp(live=False)
+    loop = app.loop  # tk.Tk for FloatApp
+
+    def sink(source, message):
+        if source == "ws":
+            app.on_ws_message(None, message)
+        else:
+            app.dispatch_extension_message(message)
+
+    def worker():
+        time.sleep(1.0)  # Let the window come up
+        stats = replayer.play(sink)
+        print(f"Replay finished: {stats}")
+        loop.after(500, loop.quit)
+
+    threading.Thread(target=worker, daemon=True).start()
+    if profile_path:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(loop.mainloop)
+        profiler.dump_stats(profile_path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    else:
+        loop.mainloop()
+
+
+def record_observer(url, path):
+    """Standalone capture of the observer stream (no UI needed)."""
+    import uuid
+    import websocket
+    for proto in ["http://", "https://", "ws://", "wss://"]:
+        if url.lower().startswith(proto): url = url[len(proto):]
+    recorder = EventRecorder(path)
+    ws_url = f"ws://{url.rstrip('/')}/ws?clientId=run_button_observer_{uuid.uuid4()}"
+    print(f"Recording {ws_url} -> {path} (Ctrl+C to stop)")
+    ws = websocket.WebSocketApp(ws_url, on_message=lambda ws, message: recorder.record("ws", message))
+    try:
+        ws.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        print(f"Recorded {recorder.count} events")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay Run Button event streams")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Record the observer stream of a ComfyUI server")
+    rec.add_argument("path")
+    rec.add_argument("--url", default="127.0.0.1:8188")
+
+    rep = sub.add_parser("replay", help="Replay a recording")
+    rep.add_argument("path")
+    rep.add_argument("--target", choices=["app", "engine", "server", "ext"], default="app")
+    rep.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N times faster, 0 = max speed")
+    rep.add_argument("--port", type=int, default=None)
+    rep.add_argument("--profile", default=None, help="Write a cProfile of the UI thread (targets 'app' and 'engine')")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record_observer(args.url, args.path)
+    elif args.target in ("app", "engine"):
+        replay_into_app(Replayer(args.path, args.speed), args.profile, headless=args.target == "engine")
+    elif args.target == "server":
+        FakeComfyServer(Replayer(args.path, args.speed, sources={"ws"}), port=args.port or 8288).serve_forever()
+    else:
+        stats = FakeExtensionClient(Replayer(args.path, args.speed, sources={"ext"}), port=args.port or 56790).run()
+        print(f"Replay finished: {stats}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Fair-share ordering of ComfyUI's prompt queue for shared servers.
+
+ComfyUI runs prompts strictly by their queue number (FIFO), so one user who
+queues 100 runs makes everyone else wait for all of them. With fair share on
+(RUN_BUTTON_FAIR_SHARE=1) every pending prompt is attributed to an owner,
+the binding code or IP behind the browser that queued it, and the pending
+part of the queue is re-numbered round-robin across owners:
+
+    A1 A2 A3 A4 B1 C1 C2   ->   B1 C1 A1 C2 A2 A3 A4   (A ran last)
+
+Each owner keeps its own order; the owner served longest ago goes first.
+Prompts queued to the front (negative numbers) are left alone. The queue
+numbers already in use are only handed out again in a new order, so nothing
+else about the queue changes. Optional quotas cap how many prompts an owner
+may have pending; new triggers beyond that are refused.
+
+Runs as a RunHistory listener: "status" (queue changed) and "execution_start"
+arrive on the history writer thread, so reordering never touches the executor.
+"""
+import time
+import heapq
+import threading
+
+WAIT_EMA_ALPHA = 0.3
+ANONYMOUS = "anonymous"
+
+
+def parse_quotas(text):
+    """'ABC=50,192.168.1.7=5' -> {"ABC": 50, "192.168.1.7": 5}; malformed entries are skipped."""
+    quotas = {}
+    for part in (text or "").split(","):
+        owner, _, value = part.strip().rpartition("=")
+        try:
+            if owner:
+                quotas[owner] = int(value)
+        except ValueError:
+            pass
+    return quotas
+
+
+class FairScheduler:
+    """
+    prompt_queue: ComfyUI's PromptQueue (mutex, queue heap, currently_running)
+    owner_for_client(client_id): fallback owner of a browser nobody assigned (e.g. its IP)
+    quota: max pending prompts per owner (0 = unlimited); quotas: per-owner overrides
+    """
+    def __init__(self, history, prompt_queue, owner_for_client=None, quota=0, quotas=None):
+        self.prompt_queue = prompt_queue
+        self.owner_for_client = owner_for_client
+        self.quota = quota
+        self.quotas = dict(quotas or {})
+        self.reorders = 0
+        self._clients = {}       # client_id (sid) -> owner
+        self._owners = {}        # prompt_id -> owner, fixed once seen
+        self._first_seen = {}    # prompt_id -> time the prompt was first seen pending
+        self._last_served = {}   # owner -> time its last prompt started
+        self._wait = {}          # owner -> [avg wait seconds, samples]
+        self._lock = threading.RLock()   # owner_for() is also used while it is held
+        history.listeners.append(self.on_event)
+
+    # --- Attribution ---
+    def assign(self, client_id, owner):
+        """Prompts queued by this browser from now on belong to `owner`."""
+        if client_id and owner:
+            with self._lock:
+                self._clients[client_id] = str(owner)
+
+    def owner_for(self, client_id):
+        with self._lock:
+            owner = self._clients.get(client_id)
+        if owner is None and client_id and self.owner_for_client:
+            owner = self.owner_for_client(client_id)
+        return owner or ANONYMOUS
+
+    def _owner_of(self, item):
+        # Items are (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+        owner = self._owners.get(item[1])
+        if owner is None:
+            extra = item[3] if len(item) > 3 and isinstance(item[3], dict) else {}
+            owner = self._owners[item[1]] = self.owner_for(extra.get("client_id"))
+        return owner
+
+    def quota_for(self, owner):
+        return self.quotas.get(owner, self.quota)
+
+    def admit(self, owner, count=1):
+        """(ok, pending): whether `owner` may queue `count` more prompts under its quota."""
+        pending = self.stats()["users"].get(owner, {}).get("queued", 0)
+        quota = self.quota_for(owner)
+        return (not quota or pending + count <= quota), pending
+
+    # --- Events ---
+    def on_event(self, event, data, ts, run):
+        if event == "execution_start":
+            prompt_id = (data or {}).get("prompt_id")
+            with self._lock:
+                owner = self._owners.get(prompt_id)
+                if owner is not None:
+                    self._last_served[owner] = ts
+                    seen = self._first_seen.pop(prompt_id, None)
+                    if seen is not None:
+                        stats = self._wait.setdefault(owner, [0.0, 0])
+                        wait = max(0.0, ts - seen)
+                        stats[0] = wait if not stats[1] else stats[0] + WAIT_EMA_ALPHA * (wait - stats[0])
+                        stats[1] += 1
+            self.rebalance()
+        elif event == "status":
+            self.rebalance()
+
+    # --- Ordering ---
+    def rebalance(self):
+        """Re-numbers the pending queue round-robin by owner. Returns True if the order changed."""
+        q = self.prompt_queue
+        now = time.time()
+        with q.mutex:
+            with self._lock:
+                pending = [item for item in q.queue if item[0] >= 0]
+                live = {item[1] for item in q.queue}
+                running = list(getattr(q, "currently_running", {}).values())
+                for item in pending + running:
+                    self._owner_of(item)
+                for item in pending:
+                    self._first_seen.setdefault(item[1], now)
+                # Forget prompts that were deleted from the queue (or have run)
+                running_ids = {item[1] for item in running}
+                for prompt_id in [p for p in self._owners if p not in live and p not in running_ids]:
+                    del self._owners[prompt_id]
+                    self._first_seen.pop(prompt_id, None)
+
+                if len(pending) < 2:
+                    return False
+                by_owner = {}
+                for item in sorted(pending, key=lambda item: item[0]):
+                    by_owner.setdefault(self._owners[item[1]], []).append(item)
+                if len(by_owner) < 2:
+                    return False
+                # Owner served longest ago first; never-served owners by their oldest prompt
+                order = sorted(by_owner, key=lambda o: (self._last_served.get(o, 0.0), by_owner[o][0][0]))
+
+            interleaved = []
+            for r in range(max(len(items) for items in by_owner.values())):
+                interleaved.extend(by_owner[o][r] for o in order if r < len(by_owner[o]))
+            numbers = sorted(item[0] for item in pending)
+            if [item[1] for item in interleaved] == [item[1] for item in sorted(pending, key=lambda item: item[0])]:
+                return False
+            renumbered = {item[1]: (number,) + tuple(item[1:]) for number, item in zip(numbers, interleaved)}
+            q.queue[:] = [renumbered.get(item[1], item) if item[0] >= 0 else item for item in q.queue]
+            heapq.heapify(q.queue)
+            self.reorders += 1
+        # Lets browsers refresh their queue view; the resulting status finds nothing to change
+        if hasattr(q, "server"):
+            q.server.queue_updated()
+        return True
+
+    # --- Reporting ---
+    def stats(self):
+        """Per owner: queued (pending), running, oldest_wait and avg_wait seconds, quota."""
+        q = self.prompt_queue
+        now = time.time()
+        with q.mutex:
+            pending = list(q.queue)
+            running = list(getattr(q, "currently_running", {}).values())
+        users = {}
+        blank = lambda: {"queued": 0, "running": False, "oldest_wait": 0.0}
+        with self._lock:
+            for item in running:
+                users.setdefault(self._owner_of(item), blank())["running"] = True
+            for item in pending:
+                user = users.setdefault(self._owner_of(item), blank())
+                user["queued"] += 1
+                seen = self._first_seen.get(item[1], now)
+                user["oldest_wait"] = max(user["oldest_wait"], round(now - seen, 1))
+            for owner, (avg, samples) in self._wait.items():
+                users.setdefault(owner, blank())["avg_wait"] = round(avg, 1)
+                users[owner]["runs"] = samples
+        for owner, user in users.items():
+            user["quota"] = self.quota_for(owner) or None
+        return {"enabled": True, "reorders": self.reorders, "users": users}
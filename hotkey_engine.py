@@ -0,0 +1,399 @@
+"""
+Global hotkey engine for the Run Button desktop app.
+
+On Windows the configured combinations are registered with the OS through
+RegisterHotKey, so the system only wakes us up for *our* key combinations -
+every other keystroke is filtered out before any Python code runs. Elsewhere
+(or when native registration is disabled) we fall back to the `keyboard`
+library's hook.
+
+Bindings support:
+  * plain combos        "ctrl+enter", "F9"
+  * chords (sequences)  "ctrl+k, r"   (second step is only armed for a short window);
+                          chords may share a prefix ("ctrl+k, r" and "ctrl+k, s")
+  * per-binding debounce windows
+Callback latency is measured so we can verify the hook adds no input lag.
+"""
+import sys
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+MOD_ALT = 0x0001
+MOD_CONTROL = 0x0002
+MOD_SHIFT = 0x0004
+MOD_WIN = 0x0008
+MOD_NOREPEAT = 0x4000
+
+WM_HOTKEY = 0x0312
+WM_QUIT = 0x0012
+WM_APP_CALL = 0x8000 + 1
+PM_NOREMOVE = 0x0000
+
+_MODIFIERS = {
+    "ctrl": MOD_CONTROL, "control": MOD_CONTROL,
+    "alt": MOD_ALT,
+    "shift": MOD_SHIFT,
+    "win": MOD_WIN, "windows": MOD_WIN, "cmd": MOD_WIN, "command": MOD_WIN,
+}
+
+_VK_NAMES = {
+    "enter": 0x0D, "return": 0x0D, "space": 0x20, "tab": 0x09,
+    "esc": 0x1B, "escape": 0x1B, "backspace": 0x08,
+    "delete": 0x2E, "del": 0x2E, "insert": 0x2D, "ins": 0x2D,
+    "home": 0x24, "end": 0x23,
+    "page up": 0x21, "pageup": 0x21, "page down": 0x22, "pagedown": 0x22,
+    "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28,
+    "pause": 0x13, "print screen": 0x2C, "scroll lock": 0x91,
+}
+
+
+def parse_combo(combo):
+    """
+    Split a hotkey string into chord steps.
+    "ctrl+k, r" -> [("ctrl+k", MOD_CONTROL, "k"), ("r", 0, "r")]
+    """
+    steps = []
+    for raw_step in combo.split(","):
+        step = raw_step.strip().lower()
+        if not step:
+            continue
+        mods = 0
+        key = None
+        for token in [t.strip() for t in step.split("+")]:
+            if token in _MODIFIERS:
+                mods |= _MODIFIERS[token]
+            elif token:
+                if key is not None:
+                    raise ValueError(f"Hotkey step '{step}' has more than one non-modifier key")
+                key = token
+        if key is None:
+            raise ValueError(f"Hotkey step '{step}' has no key")
+        steps.append((step, mods, key))
+    if not steps:
+        raise ValueError(f"Empty hotkey '{combo}'")
+    return steps
+
+
+class Binding:
+    """One named hotkey -> action mapping with its own debounce window."""
+    def __init__(self, name, combo, action, debounce=0.5):
+        self.name = name
+        self.combo = combo
+        self.action = action
+        self.debounce = debounce
+        self.steps = parse_combo(combo)
+        self.keys = tuple((mods, key) for _text, mods, key in self.steps)  # Step identity, ignoring spelling
+        self.last_fired = 0.0
+
+
+class LatencyStats:
+    """Rolling window of hotkey callback timings (milliseconds)."""
+    def __init__(self, size=256):
+        self.callback_ms = deque(maxlen=size)
+        self.queued_ms = deque(maxlen=size)
+        self.fired = 0
+        self.debounced = 0
+
+    def record(self, callback_ms, queued_ms):
+        self.callback_ms.append(callback_ms)
+        self.queued_ms.append(queued_ms)
+
+    def summary(self):
+        def describe(values):
+            if not values:
+                return {"mean": 0.0, "p99": 0.0, "max": 0.0}
+            ordered = sorted(values)
+            return {
+                "mean": round(sum(ordered) / len(ordered), 3),
+                "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+                "max": round(ordered[-1], 3),
+            }
+        return {
+            "fired": self.fired,
+            "debounced": self.debounced,
+            "callback_ms": describe(self.callback_ms),
+            "queued_ms": describe(self.queued_ms),
+        }
+
+
+# --- Backends ---
+
+class _NativeBackend:
+    """
+    Win32 RegisterHotKey backend. Hotkeys are owned by a dedicated thread with
+    its own message loop; all (un)registration is marshalled onto that thread.
+    """
+    def __init__(self, on_hotkey):
+        import ctypes
+        from ctypes import wintypes
+        self._ctypes = ctypes
+        self._wintypes = wintypes
+        self._user32 = ctypes.WinDLL("user32", use_last_error=True)
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._user32.GetMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT]
+        self._user32.PeekMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT, wintypes.UINT]
+        self._user32.PostThreadMessageW.argtypes = [wintypes.DWORD, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+        self._user32.RegisterHotKey.argtypes = [wintypes.HWND, ctypes.c_int, wintypes.UINT, wintypes.UINT]
+        self._user32.UnregisterHotKey.argtypes = [wintypes.HWND, ctypes.c_int]
+        self._user32.VkKeyScanW.argtypes = [wintypes.WCHAR]
+
+        self._on_hotkey = on_hotkey
+        self._calls = queue.Queue()
+        self._registered = set()
+        self._thread_id = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="HotkeyLoop")
+        self._thread.start()
+        if not self._ready.wait(2):
+            raise RuntimeError("Hotkey message loop did not start")
+
+    def _vk(self, key):
+        if key in _VK_NAMES:
+            return _VK_NAMES[key]
+        if key.startswith("f") and key[1:].isdigit() and 1 <= int(key[1:]) <= 24:
+            return 0x70 + int(key[1:]) - 1
+        if len(key) == 1:
+            if key.isalnum() and key.isascii():
+                return ord(key.upper())
+            scan = self._user32.VkKeyScanW(key)
+            if scan != -1:
+                return scan & 0xFF
+        raise ValueError(f"Unsupported key '{key}'")
+
+    def _loop(self):
+        user32 = self._user32
+        msg = self._wintypes.MSG()
+        self._thread_id = self._kernel32.GetCurrentThreadId()
+        # Force creation of this thread's message queue before anyone posts to it
+        user32.PeekMessageW(self._ctypes.byref(msg), None, 0, 0, PM_NOREMOVE)
+        self._ready.set()
+        while user32.GetMessageW(self._ctypes.byref(msg), None, 0, 0) > 0:
+            if msg.message == WM_HOTKEY:
+                queued_ms = float((self._kernel32.GetTickCount() - msg.time) & 0xFFFFFFFF)
+                self._on_hotkey(int(msg.wParam), queued_ms)
+            elif msg.message == WM_APP_CALL:
+                self._drain()
+        self._drain()
+        for hid in list(self._registered):
+            user32.UnregisterHotKey(None, hid)
+        self._registered.clear()
+
+    def _drain(self):
+        while True:
+            try:
+                fn, done, result = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result["value"] = fn()
+            except Exception as e:
+                result["error"] = e
+            done.set()
+
+    def call(self, fn):
+        """Run fn on the message-loop thread and return its result."""
+        if threading.get_ident() == self._thread.ident:
+            return fn()
+        done, result = threading.Event(), {}
+        self._calls.put((fn, done, result))
+        self._user32.PostThreadMessageW(self._thread_id, WM_APP_CALL, 0, 0)
+        if not done.wait(2):
+            raise TimeoutError("Hotkey message loop is not responding")
+        if "error" in result:
+            raise result["error"]
+        return result.get("value")
+
+    def register(self, hid, step):
+        _text, mods, key = step
+        if not self._user32.RegisterHotKey(None, hid, mods | MOD_NOREPEAT, self._vk(key)):
+            err = self._ctypes.get_last_error()
+            raise OSError(err, f"RegisterHotKey failed (error {err}); the combination is probably in use by another program")
+        self._registered.add(hid)
+
+    def unregister(self, hid):
+        if hid in self._registered:
+            self._user32.UnregisterHotKey(None, hid)
+            self._registered.discard(hid)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+            self._thread.join(2)
+
+
+class _HookBackend:
+    """Fallback using the `keyboard` library's global hook."""
+    def __init__(self, on_hotkey):
+        import keyboard
+        self._keyboard = keyboard
+        self._on_hotkey = on_hotkey
+        self._handles = {}
+
+    def call(self, fn):
+        return fn()
+
+    def register(self, hid, step):
+        self._handles[hid] = self._keyboard.add_hotkey(step[0], lambda: self._on_hotkey(hid, 0.0), suppress=False)
+
+    def unregister(self, hid):
+        handle = self._handles.pop(hid, None)
+        if handle is not None:
+            try: self._keyboard.remove_hotkey(handle)
+            except (KeyError, ValueError): pass
+
+    def close(self):
+        for hid in list(self._handles):
+            self.unregister(hid)
+
+
+# --- Engine ---
+
+class HotkeyEngine:
+    """
+    Owns all global hotkeys of the app.
+
+    backend: "auto" (native on Windows, hook elsewhere), "native" or "hook".
+    Note: natively registered hotkeys are exclusive - the focused window does
+    not receive the keystroke as well.
+    """
+    def __init__(self, backend="auto", chord_timeout=1.0):
+        self.chord_timeout = chord_timeout
+        self.stats = LatencyStats()
+        self._lock = threading.RLock()
+        self._bindings = []
+        self._routes = {}      # hotkey id -> step keys pressed so far, including this one
+        self._armed = []       # ids registered for a pending chord step
+        self._chord_timer = None
+        self._next_id = 1
+        self._backend = self._create_backend(backend)
+        self.backend_name = "native" if isinstance(self._backend, _NativeBackend) else "hook"
+        logging.info(f"Hotkey engine started (backend: {self.backend_name})")
+
+    def _create_backend(self, backend):
+        if backend in ("auto", "native") and sys.platform == "win32":
+            try:
+                return _NativeBackend(self._on_hotkey)
+            except Exception as e:
+                if backend == "native":
+                    raise
+                logging.warning(f"Native hotkeys unavailable, falling back to keyboard hook: {e}")
+        return _HookBackend(self._on_hotkey)
+
+    def apply(self, bindings):
+        """
+        Replace all current bindings. Returns a list of (binding, error) for
+        bindings that could not be registered.
+        Each distinct first step is registered once, however many chords start with it.
+        """
+        self.clear()
+        failures = []
+        groups = {}
+        for binding in bindings:
+            groups.setdefault(binding.keys[0], []).append(binding)
+        for first, group in groups.items():
+            try:
+                self._backend.call(lambda f=first, s=group[0].steps[0]: self._register_step((f,), s))
+            except Exception as e:
+                failures.extend((binding, e) for binding in group)
+                continue
+            with self._lock:
+                self._bindings.extend(group)
+            for binding in group:
+                logging.info(f"Hotkey bound: {binding.name} = '{binding.combo}' (debounce {int(binding.debounce * 1000)}ms)")
+        return failures
+
+    def clear(self):
+        self._backend.call(self._clear)
+
+    def stop(self):
+        self.clear()
+        self._backend.close()
+
+    def _register_step(self, path, step):
+        """Registers `step`, reached after the steps in `path[:-1]`. Returns its hotkey id."""
+        with self._lock:
+            hid = self._next_id
+            self._next_id += 1
+            self._backend.register(hid, step)
+            self._routes[hid] = path
+            return hid
+
+    def _clear(self):
+        with self._lock:
+            self._disarm()
+            for hid in list(self._routes):
+                self._backend.unregister(hid)
+            self._routes.clear()
+            self._bindings = []
+
+    # --- Chords ---
+    def _arm(self, path):
+        """Arms every next step of the chords that start with `path`, for chord_timeout seconds."""
+        self._disarm()
+        next_steps = {}
+        for binding in self._bindings:
+            if len(binding.keys) > len(path) and binding.keys[:len(path)] == path:
+                next_steps.setdefault(binding.keys[len(path)], (binding, binding.steps[len(path)]))
+        for key, (binding, step) in next_steps.items():
+            try:
+                self._armed.append(self._register_step(path + (key,), step))
+            except Exception as e:
+                logging.warning(f"Chord step '{step[0]}' of {binding.name} unavailable: {e}")
+        if not self._armed:
+            return
+        self._chord_timer = threading.Timer(self.chord_timeout, lambda: self._backend.call(self._expire_chord))
+        self._chord_timer.daemon = True
+        self._chord_timer.start()
+
+    def _expire_chord(self):
+        with self._lock:
+            self._disarm()
+
+    def _disarm(self):
+        if self._chord_timer:
+            self._chord_timer.cancel()
+            self._chord_timer = None
+        for hid in self._armed:
+            self._backend.unregister(hid)
+            self._routes.pop(hid, None)
+        self._armed = []
+
+    # --- Dispatch ---
+    def _on_hotkey(self, hid, queued_ms):
+        """Called on the backend thread. Must stay cheap: actions only schedule work."""
+        t0 = time.perf_counter()
+        fire = []
+        with self._lock:
+            path = self._routes.get(hid)
+            if path is None:
+                return
+            complete = [b for b in self._bindings if b.keys == path]
+            if any(len(b.keys) > len(path) and b.keys[:len(path)] == path for b in self._bindings):
+                self._arm(path)
+            else:
+                self._disarm()
+
+            now = time.monotonic()
+            for binding in complete:
+                if now - binding.last_fired < binding.debounce:
+                    self.stats.debounced += 1
+                    continue
+                binding.last_fired = now
+                self.stats.fired += 1
+                fire.append(binding)
+        for binding in fire:
+            try:
+                binding.action()
+            except Exception as e:
+                logging.error(f"Hotkey action '{binding.name}' failed: {e}")
+        if fire:
+            self.stats.record((time.perf_counter() - t0) * 1000.0, queued_ms)
+
+    def latency_report(self):
+        s = self.stats.summary()
+        return (f"Hotkey latency ({self.backend_name}): fired={s['fired']} debounced={s['debounced']} "
+                f"callback mean={s['callback_ms']['mean']}ms p99={s['callback_ms']['p99']}ms max={s['callback_ms']['max']}ms, "
+                f"queue delay mean={s['queued_ms']['mean']}ms max={s['queued_ms']['max']}ms")
@@ -0,0 +1,65 @@
+"""
+Short-lived dedupe cache for idempotency keys on /run_button/trigger.
+
+Clients send an `Idempotency-Key` header (or `idempotencyKey` in the body)
+that stays the same across retries of one press. The first request that
+actually reaches a browser stores its response under the key; any retry
+within `ttl` seconds gets that response back instead of queueing the
+workflow a second time.
+
+Bounded in both time and size: entries expire after `ttl` seconds and the
+oldest entries are evicted beyond `max_entries`.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+MAX_KEY_LENGTH = 128
+
+
+class IdempotencyCache:
+    def __init__(self, ttl=600.0, max_entries=2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self._entries = OrderedDict()  # key -> (expires_at, response), oldest first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def normalize(key):
+        """Returns a usable key or None (missing, wrong type or oversized keys are ignored)."""
+        if not isinstance(key, str):
+            return None
+        key = key.strip()
+        return key if 0 < len(key) <= MAX_KEY_LENGTH else None
+
+    def _expire(self, now):
+        while self._entries:
+            oldest = next(iter(self._entries))
+            if self._entries[oldest][0] > now:
+                break
+            del self._entries[oldest]
+
+    def get(self, key):
+        """The stored response for a live key, or None."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl, response)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -9,29 +9,48 @@ app.registerExtension({
         // --- Hook app.queuePrompt to track last execution time ---
         // This prevents double-submission when using shortcuts like Ctrl+Enter
         // which might be handled by BOTH the browser and our global hotkey listener.
+        // Queues made by this listener itself are not counted, so back-to-back presses all run.
         let lastQueueTime = 0;
+        let queueingFromTrigger = false;
         const originalQueuePrompt = app.queuePrompt;
         
         app.queuePrompt = async function() {
-            lastQueueTime = Date.now();
+            if (!queueingFromTrigger) lastQueueTime = Date.now();
             // console.log("[RunButton] app.queuePrompt called at", lastQueueTime);
             return originalQueuePrompt.apply(this, arguments);
         };
 
-        // Override api.addEventListener to debug if our event is even firing
-        const originalAddEventListener = api.addEventListener;
-        
+        // Idempotency keys of triggers already run (insertion-ordered Set used as a small LRU).
+        // Every press has its own key, so N presses in a row are N runs and a retried press is one.
+        const MAX_SEEN_KEYS = 512;
+        const seenTriggerKeys = new Set();
+
+        function isRepeatedKey(key) {
+            if (seenTriggerKeys.has(key)) return true;
+            seenTriggerKeys.add(key);
+            if (seenTriggerKeys.size > MAX_SEEN_KEYS) {
+                seenTriggerKeys.delete(seenTriggerKeys.values().next().value);
+            }
+            return false;
+        }
+
         // Explicitly listen for our event
         api.addEventListener("run_button.trigger", (event) => {
             console.log("%c[RunButton] 🚀 TRIGGER RECEIVED!", "color: red; font-size: 20px; font-weight: bold;");
             
-            // Debounce check: If a queue happened < 500ms ago, ignore this trigger
+            const key = event.detail?.key;
+            if (key && isRepeatedKey(key)) {
+                console.log(`[RunButton] ⚠️ Ignoring repeated trigger ${key}.`);
+                return;
+            }
+            // Debounce check: If the page itself queued < 500ms ago (same keypress), ignore this trigger
             const timeSinceLastQueue = Date.now() - lastQueueTime;
             if (timeSinceLastQueue < 500) {
                 console.log(`[RunButton] ⚠️ Ignoring trigger because queuePrompt was called ${timeSinceLastQueue}ms ago.`);
                 return;
             }
 
+            queueingFromTrigger = true;
             try {
                 // Try clicking the physical button first - it's often more reliable than app.queuePrompt(0)
                 // because it handles shift/ctrl states and UI updates correctly
@@ -57,47 +76,148 @@ app.registerExtension({
                 
             } catch (e) {
                 console.error("[RunButton] ❌ Error triggering queue:", e);
+            } finally {
+                queueingFromTrigger = false;
             }
         });
 
-        // --- HANDSHAKE: Register with local Desktop App ---
-        // This tries to tell the local float_run.py "I am the browser on this machine, here is my ID"
-        // so it can target ME specifically instead of broadcasting.
-        async function registerWithLocalSidecar() {
+        // --- PARAMETER SWEEP: the Desktop App asks for the current workflow ---
+        // The server expands and queues all variants itself; we only send the graph once.
+        api.addEventListener("run_button.sweep_request", async (event) => {
+            const req = event.detail || {};
+            console.log(`[RunButton] Sweep ${req.sweep_id} requested, sending current workflow...`);
             try {
-                const clientId = api.clientId;
-                if (!clientId) {
-                    console.log("[RunButton] No api.clientId yet, retrying handshake in 1s...");
-                    setTimeout(registerWithLocalSidecar, 1000);
-                    return;
-                }
-
-                console.log("[RunButton] Attempting handshake with local Desktop App...", clientId);
-                
-                // We use 127.0.0.1:56789 (The Sidecar Port)
-                // Note: If you use HTTPS for ComfyUI, this might be blocked by Mixed Content policies.
-                // But most local users use HTTP.
-                const resp = await fetch("http://127.0.0.1:56789/register", {
+                const p = await app.graphToPrompt();
+                const resp = await fetch("/run_button/sweep", {
                     method: "POST",
                     headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify({ clientId: clientId })
+                    body: JSON.stringify({
+                        sweepId: req.sweep_id,
+                        grid: req.grid,
+                        mode: req.mode,
+                        front: req.front,
+                        prompt: p.output,
+                        workflow: p.workflow,
+                        client_id: api.clientId
+                    })
                 });
-
-                if (resp.ok) {
-                    console.log("%c[RunButton] ✅ Handshake Successful! Desktop App knows my ID.", "color: green");
+                const result = await resp.json();
+                if (result.status === "queued") {
+                    console.log(`[RunButton] Sweep ${result.sweep_id}: ${result.n} variants queued.`);
                 } else {
-                    console.warn("[RunButton] Handshake failed (Server error). Retrying...");
-                    setTimeout(registerWithLocalSidecar, 5000);
+                    console.warn("[RunButton] Sweep rejected:", result.message, result.node_errors || "");
                 }
             } catch (e) {
-                // This is expected if the desktop app is not running yet
-                console.log("[RunButton] Desktop App not found (yet). Retrying handshake in 5s...");
-                setTimeout(registerWithLocalSidecar, 5000);
+                console.error("[RunButton] ❌ Error sending sweep workflow:", e);
             }
+        });
+
+        // --- HANDSHAKE: Register with local Desktop App ---
+        // Tells the local float_run.py "I am the browser on this machine, here is my ID"
+        // so it can target ME specifically instead of broadcasting.
+        // One socket per tab stays open to the sidecar (127.0.0.1:56789): the desktop learns
+        // about new client ids and closed tabs immediately, and nothing is polled.
+        // Note: If you use HTTPS for ComfyUI, this might be blocked by Mixed Content policies.
+        const HANDSHAKE_URL = "ws://127.0.0.1:56789/handshake";
+        const MIN_RETRY_MS = 1000;
+        const MAX_RETRY_MS = 5 * 60 * 1000;
+
+        // Per page load, not sessionStorage: a duplicated tab copies sessionStorage and would share the id
+        const tabId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
+        let handshakeSocket = null;
+        let retryDelay = MIN_RETRY_MS;
+        let retryTimer = null;
+        let registeredClientId = null;
+        // Lets the other ComfyUI tabs skip the rest of their backoff once the desktop app is up
+        const tabsChannel = ("BroadcastChannel" in window) ? new BroadcastChannel("run_button_handshake") : null;
+
+        function sendTabState(type) {
+            if (!handshakeSocket || handshakeSocket.readyState !== WebSocket.OPEN) return;
+            handshakeSocket.send(JSON.stringify({
+                type,
+                tabId,
+                clientId: api.clientId,
+                visible: document.visibilityState === "visible",
+                focused: document.hasFocus()
+            }));
+            if (type === "register") registeredClientId = api.clientId;
         }
-        
-        // Start handshake loop
-        setTimeout(registerWithLocalSidecar, 1000);
+
+        function scheduleHandshake(delay) {
+            if (retryTimer || handshakeSocket) return;
+            retryTimer = setTimeout(connectHandshake, delay);
+        }
+
+        function retryHandshakeNow() {
+            clearTimeout(retryTimer);
+            retryTimer = null;
+            retryDelay = MIN_RETRY_MS;
+            scheduleHandshake(0);
+        }
+
+        function connectHandshake() {
+            retryTimer = null;
+            if (!api.clientId) {
+                scheduleHandshake(1000);
+                return;
+            }
+            let socket;
+            try {
+                socket = new WebSocket(HANDSHAKE_URL);
+            } catch (e) {
+                console.warn("[RunButton] Handshake socket blocked:", e);
+                return;
+            }
+            handshakeSocket = socket;
+            socket.onopen = () => {
+                retryDelay = MIN_RETRY_MS;
+                sendTabState("register");
+                tabsChannel?.postMessage("desktop-up");
+                console.log("%c[RunButton] ✅ Handshake channel open. Desktop App knows my ID.", "color: green");
+            };
+            socket.onmessage = (event) => {
+                try {
+                    const msg = JSON.parse(event.data);
+                    if (msg.type === "target") {
+                        console.log(`[RunButton] This tab is ${msg.active ? "" : "not "}the Desktop App's target.`);
+                    }
+                } catch (e) { }
+            };
+            socket.onclose = () => {
+                if (handshakeSocket !== socket) return;
+                handshakeSocket = null;
+                registeredClientId = null;
+                // Desktop App not running (yet): back off exponentially, with jitter so tabs spread out
+                const delay = retryDelay * (0.8 + Math.random() * 0.4);
+                retryDelay = Math.min(retryDelay * 2, MAX_RETRY_MS);
+                scheduleHandshake(delay);
+            };
+        }
+
+        // ComfyUI gets a new clientId when its own socket reconnects: re-register right away
+        const onClientIdMaybeChanged = () => {
+            if (api.clientId && api.clientId !== registeredClientId) sendTabState("register");
+        };
+        api.addEventListener("status", onClientIdMaybeChanged);
+        api.addEventListener("reconnected", onClientIdMaybeChanged);
+
+        // The desktop prefers the focused / visible tab
+        document.addEventListener("visibilitychange", () => {
+            sendTabState("update");
+            if (document.visibilityState === "visible" && !handshakeSocket) retryHandshakeNow();
+        });
+        window.addEventListener("focus", () => sendTabState("update"));
+        window.addEventListener("blur", () => sendTabState("update"));
+
+        if (tabsChannel) {
+            tabsChannel.onmessage = (event) => {
+                if (event.data === "desktop-up" && !handshakeSocket) retryHandshakeNow();
+            };
+        }
+
+        // Start handshake
+        scheduleHandshake(1000);
 
         // --- MANUAL BINDING ---
         // Register a setting in ComfyUI for the user to enter a Pairing Code
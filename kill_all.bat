@@ -4,6 +4,9 @@ echo Killing all running run_button instances...
 :: 1. Kill python processes running float_run.py
 wmic process where "CommandLine like '%%float_run.py%%'" call terminate >nul 2>nul
 
+:: 2. Kill headless daemons (run_engine.py daemon)
+wmic process where "CommandLine like '%%run_engine.py%%'" call terminate >nul 2>nul
+
 echo.
 echo All instances should be closed now.
 pause
\ No newline at end of file
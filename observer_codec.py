@@ -0,0 +1,166 @@
+"""
+Compact event encoding shared by the server extension, the desktop app and
+the Chrome extension batches.
+
+Compact schema (only what the desktop app uses):
+    {t: type, p: prompt_id, n: node, v: value, m: max, q: queue_remaining, d: raw data}
+
+Negotiated observer connections (/run_button/observer) can additionally use:
+  * "binary" packing: 1 type byte + 1 flag byte + fixed fields, JSON fallback for the rest
+  * sticky prompt ids: `p` is only sent when it changes
+  * zlib stream compression with a shared window across messages (Z_SYNC_FLUSH per
+    message), equivalent to permessage-deflate with context takeover but usable
+    from clients whose websocket library has no deflate support.
+Stdlib only, so it can be imported from both sides.
+"""
+import json
+import zlib
+import struct
+
+ENCODINGS = ("compact", "binary")
+
+TYPE_CODES = {
+    "progress": 1, "executing": 2, "status": 3, "execution_start": 4,
+    "execution_success": 5, "execution_error": 6, "execution_interrupted": 7,
+}
+CODE_TYPES = {code: name for name, code in TYPE_CODES.items()}
+
+FLAG_PROMPT = 0x01
+FLAG_NO_NODE = 0x02
+FLAG_NODE_ABSENT = 0x04  # The event has no node at all (execution_start), not node None
+
+
+def compact_event(event, data):
+    """Reduces a ComfyUI (type, data) event to the compact schema."""
+    ev = {"t": event}
+    data = data if isinstance(data, dict) else {}
+    if event == "status":
+        status = data.get("status") or data
+        ev["q"] = ((status or {}).get("exec_info") or {}).get("queue_remaining", 0) or 0
+        return ev
+    if event not in TYPE_CODES:
+        ev["d"] = data
+        return ev
+    if "prompt_id" in data: ev["p"] = data["prompt_id"]
+    if "node" in data: ev["n"] = data["node"]
+    elif "node_id" in data: ev["n"] = data["node_id"]
+    if "value" in data: ev["v"] = data["value"]
+    if "max" in data: ev["m"] = data["max"]
+    return ev
+
+
+def expand_compact_event(ev):
+    """Converts a compact event back into the (type, data) shape ComfyUI uses."""
+    mtype = ev.get("t")
+    if mtype == "status":
+        return mtype, {"status": {"exec_info": {"queue_remaining": ev.get("q", 0)}}}
+    data = dict(ev.get("d") or {}) if isinstance(ev.get("d"), dict) else {}
+    if "p" in ev: data["prompt_id"] = ev["p"]
+    if "n" in ev: data["node"] = ev["n"]
+    if "v" in ev: data["value"] = ev["v"]
+    if "m" in ev: data["max"] = ev["m"]
+    return mtype, data
+
+
+def _pack_binary(ev):
+    code = TYPE_CODES.get(ev["t"])
+    numeric_ok = all(isinstance(ev.get(k, 0), int) and 0 <= ev.get(k, 0) < 2 ** 32 for k in ("v", "m", "q"))
+    if code is None or not numeric_ok or set(ev) - {"t", "p", "n", "v", "m", "q"}:
+        return b"\x00" + json.dumps(ev, separators=(",", ":")).encode("utf-8")
+
+    flags, parts = 0, []
+    if "p" in ev:
+        flags |= FLAG_PROMPT
+        prompt = str(ev["p"]).encode("utf-8")
+        parts.append(struct.pack(">B", len(prompt)) + prompt)
+    node = ev.get("n")
+    if node is None:
+        flags |= FLAG_NO_NODE if "n" in ev else FLAG_NO_NODE | FLAG_NODE_ABSENT
+    if ev["t"] == "progress":
+        parts.append(struct.pack(">II", ev.get("v", 0), ev.get("m", 0)))
+    elif ev["t"] == "status":
+        parts.append(struct.pack(">I", ev.get("q", 0)))
+    if node is not None:
+        parts.append(str(node).encode("utf-8"))
+    return struct.pack(">BB", code, flags) + b"".join(parts)
+
+
+def _unpack_binary(payload):
+    code = payload[0]
+    if code == 0:
+        return json.loads(payload[1:].decode("utf-8"))
+    flags = payload[1]
+    ev, pos = {"t": CODE_TYPES[code]}, 2
+    if flags & FLAG_PROMPT:
+        size = payload[pos]
+        ev["p"] = payload[pos + 1:pos + 1 + size].decode("utf-8")
+        pos += 1 + size
+    if ev["t"] == "progress":
+        ev["v"], ev["m"] = struct.unpack_from(">II", payload, pos)
+        pos += 8
+    elif ev["t"] == "status":
+        ev["q"], = struct.unpack_from(">I", payload, pos)
+        pos += 4
+    if ev["t"] != "status" and not flags & FLAG_NODE_ABSENT:
+        ev["n"] = None if flags & FLAG_NO_NODE else payload[pos:].decode("utf-8")
+    return ev
+
+
+class ObserverEncoder:
+    """One per connection: prompt ids and the zlib window are per-stream state."""
+    def __init__(self, encoding="compact", use_zlib=False):
+        self.encoding = encoding if encoding in ENCODINGS else "compact"
+        self.use_zlib = use_zlib
+        self._last_prompt = None
+        self._zlib = zlib.compressobj(6, zlib.DEFLATED, -15) if use_zlib else None
+
+    def hello(self):
+        return json.dumps({"t": "hello", "encoding": self.encoding, "zlib": self.use_zlib})
+
+    def encode(self, event, data):
+        """Returns str (text frame) or bytes (binary frame)."""
+        ev = compact_event(event, data)
+        if "p" in ev:
+            if ev["p"] == self._last_prompt:
+                del ev["p"]
+            else:
+                self._last_prompt = ev["p"]
+        if self.encoding == "binary":
+            payload = _pack_binary(ev)
+        else:
+            payload = json.dumps(ev, separators=(",", ":"))
+            if not self._zlib:
+                return payload
+            payload = payload.encode("utf-8")
+        if self._zlib:
+            payload = self._zlib.compress(payload) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+        return payload
+
+
+class ObserverDecoder:
+    """Client side. The first message of a negotiated stream is the server's hello."""
+    def __init__(self):
+        self.encoding = None
+        self.use_zlib = False
+        self._last_prompt = None
+        self._zlib = None
+
+    def feed(self, message):
+        """Returns a list of (type, data) events (empty for the hello)."""
+        if self.encoding is None:
+            hello = json.loads(message)
+            self.encoding = hello.get("encoding", "compact")
+            self.use_zlib = bool(hello.get("zlib"))
+            self._zlib = zlib.decompressobj(-15) if self.use_zlib else None
+            return []
+        if self._zlib:
+            message = self._zlib.decompress(message)
+        if self.encoding == "binary":
+            ev = _unpack_binary(message)
+        else:
+            ev = json.loads(message)
+        if "p" in ev:
+            self._last_prompt = ev["p"]
+        elif ev.get("t") in TYPE_CODES and ev.get("t") != "status" and self._last_prompt is not None:
+            ev["p"] = self._last_prompt
+        return [expand_compact_event(ev)]
@@ -0,0 +1,89 @@
+"""
+Negotiated observer connections for the Run Button server extension.
+
+Legacy observers connect to ComfyUI's own /ws and receive full JSON events.
+Observers that opt in connect to /run_button/observer instead:
+
+    /run_button/observer?clientId=run_button_observer_<id>&encoding=compact|binary&zlib=1
+
+and receive the compact schema from observer_codec (optionally binary packed
+and zlib-stream compressed). The websocket also offers permessage-deflate,
+which aiohttp negotiates with clients that support it.
+
+Events are published from the executor thread; each connection has its own
+asyncio queue and sender task so encoder state (sticky prompt ids, zlib
+window) is always applied in order.
+"""
+import asyncio
+import uuid
+
+from aiohttp import web, WSMsgType
+
+from .observer_codec import ObserverEncoder
+
+
+class CompactObserverHub:
+    def __init__(self, get_loop, initial_events=None, max_backlog=1000):
+        self._get_loop = get_loop
+        self._initial_events = initial_events  # () -> [(event, data)] sent right after the hello
+        self._max_backlog = max_backlog
+        self._observers = {}  # sid -> asyncio.Queue
+
+    def __len__(self):
+        return len(self._observers)
+
+    def sids(self):
+        return list(self._observers)
+
+    def publish(self, event, data):
+        """Thread-safe: may be called from the executor or any worker thread."""
+        if not self._observers:
+            return
+        loop = self._get_loop()
+        for q in list(self._observers.values()):
+            loop.call_soon_threadsafe(self._enqueue, q, event, data)
+
+    def _enqueue(self, q, event, data):
+        if q.qsize() >= self._max_backlog:
+            # Slow consumer: drop the oldest event rather than grow without bound
+            try: q.get_nowait()
+            except asyncio.QueueEmpty: pass
+        q.put_nowait((event, data))
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse(compress=True, heartbeat=30)
+        await ws.prepare(request)
+
+        sid = request.query.get("clientId") or f"run_button_observer_{uuid.uuid4()}"
+        encoder = ObserverEncoder(request.query.get("encoding", "compact"), request.query.get("zlib") == "1")
+        q = asyncio.Queue()
+        self._observers[sid] = q
+        print(f"[RunButton] Compact observer connected: {sid} ({encoder.encoding}{', zlib' if encoder.use_zlib else ''})")
+
+        sender = asyncio.ensure_future(self._sender(ws, encoder, q))
+        try:
+            await ws.send_str(encoder.hello())
+            for event, data in (self._initial_events() if self._initial_events else []):
+                q.put_nowait((event, data))
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._observers.pop(sid, None)
+            sender.cancel()
+        return ws
+
+    @staticmethod
+    async def _sender(ws, encoder, q):
+        while not ws.closed:
+            event, data = await q.get()
+            try:
+                payload = encoder.encode(event, data)
+                if isinstance(payload, str):
+                    await ws.send_str(payload)
+                else:
+                    await ws.send_bytes(payload)
+            except (ConnectionResetError, RuntimeError):
+                return
+            except Exception as e:
+                print(f"[RunButton] Failed to send {event} to compact observer: {e}")
@@ -0,0 +1,139 @@
+"""
+Output previews for Run Button observers.
+
+`executed` events are handed to a single background thread which loads the
+image outputs, shrinks them to small palette PNGs (Tk can display PNG without
+Pillow on the client) and pushes them to observers. Thumbnails are kept in an
+LRU cache keyed by output file, so repeated requests never touch the disk or
+re-encode. Full-resolution images are never sent over the observer channel,
+and the prompt executor only pays for a queue put.
+"""
+import os
+import io
+import base64
+import queue
+import threading
+from collections import OrderedDict
+
+PREVIEW_EVENT = "run_button.preview"
+PREVIEW_MAX_SIZE = 160
+PREVIEW_COLORS = 128
+
+
+class ThumbnailCache:
+    """Thread-safe LRU of encoded thumbnails: key -> (png bytes, width, height)."""
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, item):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+
+class PreviewWorker:
+    """
+    publish(event, data) must be thread-safe and deliver to all observers;
+    has_observers() tells whether anyone is listening.
+    """
+    def __init__(self, publish, has_observers, cache_size=64, max_pending=16):
+        self.cache = ThumbnailCache(cache_size)
+        self._publish = publish
+        self._has_observers = has_observers
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="RunButtonPreviews")
+        self._thread.start()
+
+    def submit(self, data):
+        """Called from the executor thread. Never blocks; drops work if we fall behind."""
+        images = ((data or {}).get("output") or {}).get("images") or []
+        if not images:
+            return
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            pass # Executor is outrunning us; previews are best-effort
+
+    def _loop(self):
+        while True:
+            data = self._queue.get()
+            try:
+                self._process(data)
+            except Exception as e:
+                print(f"[RunButton] Preview generation failed: {e}")
+
+    def _process(self, data):
+        if not self._has_observers():
+            return
+        # Only the last image of a node's output is previewed (the newest in a batch)
+        image = data["output"]["images"][-1]
+        thumb = self.get_thumbnail(image)
+        if thumb is None:
+            return
+
+        png, width, height = thumb
+        payload = {
+            "prompt_id": data.get("prompt_id"),
+            "node": data.get("node"),
+            "filename": image.get("filename"),
+            "subfolder": image.get("subfolder", ""),
+            "type": image.get("type", "output"),
+            "width": width,
+            "height": height,
+            "image": base64.b64encode(png).decode("ascii"),
+        }
+        self._publish(PREVIEW_EVENT, payload)
+
+    @staticmethod
+    def key_for(image):
+        return (image.get("type", "output"), image.get("subfolder", ""), image.get("filename"))
+
+    def get_thumbnail(self, image):
+        """Cached (png, width, height) for an output image, or None if it does not exist."""
+        key = self.key_for(image)
+        thumb = self.cache.get(key)
+        if thumb is None:
+            thumb = self.make_thumbnail(image)
+            if thumb is not None:
+                self.cache.put(key, thumb)
+        return thumb
+
+    def make_thumbnail(self, image):
+        path = self.resolve_path(image)
+        if not path or not os.path.isfile(path):
+            return None
+        from PIL import Image
+        with Image.open(path) as img:
+            img.draft("RGB", (PREVIEW_MAX_SIZE, PREVIEW_MAX_SIZE))  # Cheap JPEG downscale on decode
+            img = img.convert("RGB")
+            img.thumbnail((PREVIEW_MAX_SIZE, PREVIEW_MAX_SIZE))
+            img = img.quantize(colors=PREVIEW_COLORS)
+            buf = io.BytesIO()
+            img.save(buf, format="PNG", optimize=True)
+            return buf.getvalue(), img.width, img.height
+
+    @staticmethod
+    def resolve_path(image):
+        import folder_paths
+        filename = image.get("filename")
+        if not filename:
+            return None
+        base_dir = folder_paths.get_directory_by_type(image.get("type", "output"))
+        if base_dir is None:
+            return None
+        path = os.path.abspath(os.path.join(base_dir, image.get("subfolder", ""), filename))
+        # Never serve anything outside ComfyUI's own output/temp/input folders
+        if os.path.commonpath([path, os.path.abspath(base_dir)]) != os.path.abspath(base_dir):
+            return None
+        return path
@@ -0,0 +1,1139 @@
+"""
+Run Button engine: connection, trigger and state logic without any UI.
+
+FloatApp (float_run.py) is this engine plus the Tk window. The same engine
+runs headless as a daemon, e.g. on a render node or in automation, and is
+then controlled through the local state relay (state_relay.py) or this
+module's CLI:
+
+    python run_engine.py daemon [--hotkeys]
+    python run_engine.py trigger [--count 4]
+    python run_engine.py stop
+    python run_engine.py status
+
+Nothing here imports tkinter. All state lives in a ButtonState; the Tk app
+swaps in DesignButton, which has the same attributes and methods, so every
+handler below works unchanged against either.
+"""
+import requests
+import threading
+import websocket
+import json
+import time
+import os
+import sys
+import heapq
+import signal
+import socket
+import logging
+import argparse
+import uuid
+import urllib.request
+
+from hotkey_engine import HotkeyEngine, Binding
+from trigger_outbox import TriggerOutbox
+from trigger_backlog import TriggerBacklog
+from event_replay import EventRecorder
+from observer_codec import ObserverDecoder, expand_compact_event
+from state_relay import StateRelay
+from browser_handshake import BrowserTabRegistry, comfy_origins, start_sidecar
+from ws_util import ws_accept_key, ws_frame, ws_read_frame, socket_reader
+
+# --- Config & Logging Setup ---
+
+def get_data_path(filename):
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, filename)
+
+def get_config_path():
+    return get_data_path("config.json")
+
+CONFIG_FILE = get_config_path()
+OUTBOX_FILE = get_data_path("run_button_outbox.json")
+DEFAULT_CONFIG = {
+    "comfy_url": "127.0.0.1:8188",
+    "hotkey_toggle": "F9",
+    "hotkey_run": "ctrl+enter",
+    "hotkey_stop": "",
+    "hotkey_run_batch": "",
+    "run_batch_count": 4,
+    "hotkey_backend": "auto", # auto, native (Win32 RegisterHotKey) or hook (keyboard lib)
+    "hotkey_debounce_ms": {"run": 500, "run_batch": 1500, "stop": 300, "toggle": 500},
+    "outbox_expiry_s": 120,   # Offline presses older than this are not replayed
+    "outbox_dedupe_s": 3,     # Repeated presses within this window are merged
+    "trigger_retries": 2,     # Timed-out triggers are resent with the same idempotency key
+    "backlog_mode": False,    # Hold presses locally, release while the server queue is below backlog_depth
+    "backlog_depth": 2,       # Target queue_remaining (running + pending) on the server
+    "relay_port": 56791,      # Local state relay for other tools (0 = off), see state_relay.py
+    "relay_allowed_origins": [], # Web origins allowed to open the relay websocket
+    "sidecar_allowed_origins": [], # Extra ComfyUI page origins for the browser handshake (e.g. a LAN address)
+    "record_events": "",      # If set, observer + extension streams are recorded to this file (see event_replay.py)
+    "observer_encoding": "json", # json (plain /ws), compact or binary (negotiated /run_button/observer)
+    "observer_compress": True,   # zlib-compress the negotiated observer stream
+    "control_mode": "api" # api or extension
+}
+
+# Hotkey binding name -> config key
+HOTKEY_CONFIG_KEYS = {
+    "run": "hotkey_run",
+    "run_batch": "hotkey_run_batch",
+    "stop": "hotkey_stop",
+    "toggle": "hotkey_toggle",
+}
+
+def setup_logging():
+    log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_button_debug.log")
+    
+    # Create handlers
+    file_handler = logging.FileHandler(log_file, encoding='utf-8', mode='a')
+    console_handler = logging.StreamHandler()
+    
+    # Create formatters
+    log_format = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    file_handler.setFormatter(log_format)
+    console_handler.setFormatter(log_format)
+    
+    # Configure root logger
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    
+    # Remove existing handlers to avoid duplicates
+    if logger.hasHandlers():
+        logger.handlers.clear()
+        
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    
+    return log_file
+
+LOG_FILE = setup_logging()
+
+def process_rss_mb():
+    """Resident memory of this process in MB (None if unknown). Stdlib only."""
+    try:
+        if os.name == 'nt':
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                     ctypes.byref(counters), counters.cb)
+            return round(counters.WorkingSetSize / 1048576, 1)
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except Exception:
+        return None
+
+# --- Headless State & Loop ---
+
+class ButtonState:
+    """The button's state without a window. DesignButton exposes the same interface."""
+    def __init__(self):
+        self.state = "offline" # idle, running, offline
+        self.control_mode = "api"
+        self.is_mini = False
+        self.progress = 0.0
+        self.queue_count = 0
+        self.outbox_count = 0
+        self.backlog_count = 0
+        self.eta_text = ""
+        self.queue_eta_text = ""
+        self.sweep_text = ""
+        self.hold_draw = False
+        self.changed_cmd = None
+
+    def set_state(self, state, progress=0.0, queue=0):
+        self.state = state
+        self.progress = progress
+        self.queue_count = queue
+        self.draw()
+
+    def set_mode(self, is_mini):
+        self.is_mini = is_mini
+
+    def draw(self, event=None):
+        # Nothing to paint; just tell listeners (the relay) that state may have changed
+        if self.hold_draw: return
+        if self.changed_cmd: self.changed_cmd()
+
+
+class HeadlessLoop:
+    """Minimal stand-in for Tk's event loop: after(ms, fn) from any thread, callbacks run on one thread."""
+    def __init__(self):
+        self._timers = []  # (due, seq, fn)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+
+    def after(self, ms, fn):
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._timers, (time.monotonic() + ms / 1000.0, self._seq, fn))
+            self._cond.notify()
+
+    def quit(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def mainloop(self):
+        self._running = True
+        while True:
+            with self._cond:
+                while self._running and (not self._timers or self._timers[0][0] > time.monotonic()):
+                    self._cond.wait(self._timers[0][0] - time.monotonic() if self._timers else None)
+                if not self._running:
+                    return
+                _due, _seq, fn = heapq.heappop(self._timers)
+            try:
+                fn()
+            except Exception as e:
+                logging.error(f"Callback failed: {e}")
+
+# --- Engine ---
+
+class RunEngine:
+    """
+    loop: object with after(ms, fn) that runs callbacks on one thread (tk.Tk or HeadlessLoop).
+    live: False builds the engine offline (no ComfyUI connection, sidecar, extension
+    server, relay or recording), for feeding it recorded events (event_replay.py).
+    Subclasses create the view (create_view) and may override the UI hooks
+    (on_press_feedback, safe_alert, handle_hotkey_conflict, set_preview).
+    """
+    def __init__(self, loop, hotkeys=True, live=True):
+        self.loop = loop
+
+        # State Variables
+        self.is_mini = False
+        self.ws = None
+        self.ws_connected = False
+        self.extension_socket = None
+        self.extension_connected = False
+        
+        self.browser_client_id = None
+        self.browser_tabs = BrowserTabRegistry(on_change=self.on_browser_target)
+        self.sidecar_origins = set() # Pages allowed to use the handshake, kept in sync by setup_urls
+        self.client_id = None
+        self.ws_decoder = None # Set when the negotiated observer stream is in use
+        self.system_stats = None # Last /system_stats snapshot (polled or pushed)
+        self.last_trigger_time = 0
+        self._ws_opened = threading.Event() # Wakes the connection manager on reconnect
+        self.last_preview = None   # Latest output thumbnail event (base64 PNG)
+        self.eta_deadline = None   # time.monotonic() at which the running prompt should finish
+        self.queue_eta_deadline = None
+        self.sweep = None # Last run_button.sweep progress ("k of N")
+        
+        # Config
+        self.load_config()
+        self.setup_urls()
+        self.outbox = TriggerOutbox(OUTBOX_FILE,
+                                    expiry=float(self.config.get("outbox_expiry_s", 120)),
+                                    dedupe_window=float(self.config.get("outbox_dedupe_s", 3)))
+        self.backlog = TriggerBacklog(self.config.get("backlog_depth", 2))
+        self._backlog_releasing = False
+        self.relay = None
+        if live and self.config.get("relay_port"):
+            self.relay = StateRelay(self.get_relay_state, self.handle_relay_command,
+                                    port=int(self.config["relay_port"]),
+                                    allowed_origins=self.config.get("relay_allowed_origins") or ())
+        
+        # View (window or headless state)
+        self.btn = self.create_view()
+        self.btn.changed_cmd = lambda: self.relay and self.relay.notify()
+        self.btn.outbox_count = len(self.outbox)
+
+        # Optional event stream recording for offline replay/profiling
+        self.recorder = None
+        if live and self.config.get("record_events"):
+            path = time.strftime(self.config["record_events"])
+            try:
+                self.recorder = EventRecorder(path)
+                logging.info(f"Recording event streams to {path}")
+            except Exception as e:
+                logging.error(f"Cannot record events to {path}: {e}")
+        
+        # Hotkeys
+        self.hotkeys = None
+        if hotkeys:
+            self.hotkeys = HotkeyEngine(backend=self.config.get("hotkey_backend", "auto"))
+            self.setup_hotkey()
+        
+        # Apply Mode
+        self.btn.control_mode = self.config.get("control_mode", "api")
+        
+        # Start Background Threads
+        if live:
+            # Connection Manager (Ping / Reconnect)
+            threading.Thread(target=self.connection_manager_loop, daemon=True).start()
+            # Sidecar Server (Browser Handshake)
+            threading.Thread(target=self.start_sidecar_server, daemon=True).start()
+            # Extension WebSocket Server
+            threading.Thread(target=self.start_extension_ws_server, daemon=True).start()
+        # Local state relay (one ComfyUI connection shared by all local tools)
+        if self.relay:
+            self.relay.start()
+
+        self.loop.after(1000, self._eta_tick)
+
+    # --- View Hooks (overridden by the Tk app) ---
+    def create_view(self):
+        return ButtonState()
+
+    def on_press_feedback(self):
+        pass
+
+    def set_preview(self, data):
+        self.last_preview = data
+
+    def safe_alert(self, title, msg, type="info"):
+        log = logging.error if type == "error" else logging.warning
+        log(f"{title}: {msg}")
+
+    # --- Configuration Methods ---
+    def load_config(self):
+        self.config = DEFAULT_CONFIG.copy()
+        if os.path.exists(CONFIG_FILE):
+            try:
+                with open(CONFIG_FILE, 'r') as f:
+                    self.config.update(json.load(f))
+            except: pass
+
+    def save_config(self):
+        try:
+            with open(CONFIG_FILE, 'w') as f:
+                json.dump(self.config, f, indent=4)
+        except: pass
+
+    def setup_urls(self):
+        base = self.config.get("comfy_url", "127.0.0.1:8188")
+        for proto in ["http://", "https://", "ws://", "wss://"]:
+            if base.lower().startswith(proto): base = base[len(proto):]
+        base = base.rstrip("/")
+        origins = comfy_origins(base) | set(self.config.get("sidecar_allowed_origins") or ())
+        self.sidecar_origins.intersection_update(origins)  # In place: the sidecar thread holds this set
+        self.sidecar_origins.update(origins)
+        self.trigger_url = f"http://{base}/run_button/trigger"
+        self.sweep_url = f"http://{base}/run_button/sweep"
+        self.interrupt_url = f"http://{base}/interrupt"
+        self.ws_url = f"ws://{base}/ws"
+        self.observer_url = f"ws://{base}/run_button/observer"
+        self.observer_fallback = False
+        # Shared, cached stats on servers with this extension; plain /system_stats otherwise
+        self.stats_url = f"http://{base}/run_button/system_stats"
+        self.legacy_stats_url = f"http://{base}/system_stats"
+        self.stats_etag = None
+
+    # --- Trigger / Action Logic ---
+    def send_trigger(self, count=1, debounce=False):
+        """
+        Called by Hotkey Hook or UI Click.
+        MUST be non-blocking and thread-safe.
+        Hotkeys have their own per-binding debounce; `debounce` is for clicks.
+        """
+        try:
+            # Dispatch to main thread to avoid blocking the hook
+            self.loop.after(0, lambda: self._handle_trigger_dispatch(count, debounce))
+        except:
+            # If the loop is dead, do nothing
+            pass
+
+    def send_batch_trigger(self):
+        self.send_trigger(count=max(1, int(self.config.get("run_batch_count", 4))))
+
+    def _handle_trigger_dispatch(self, count=1, debounce=False):
+        """Main thread handler for trigger"""
+        # 1. Visual Feedback
+        self.on_press_feedback()
+
+        # 2. Click debounce (a press in flight is no reason to drop the next one:
+        #    every press carries its own idempotency key)
+        if debounce and time.time() - self.last_trigger_time < 0.5:
+            return
+        self.last_trigger_time = time.time()
+        
+        # 3. Start Worker Thread
+        threading.Thread(target=self._trigger_worker, args=(count,), daemon=True).start()
+
+    def _trigger_worker(self, count=1):
+        try:
+            logging.info(f"Trigger initiated (Worker Thread), count={count}")
+            
+            # Extension Mode
+            if self.config.get("control_mode") == "extension":
+                for _ in range(count):
+                    self.send_extension_trigger()
+                return
+                
+            # API Mode
+            if self.config.get("backlog_mode"):
+                self.backlog.add(count)
+                logging.info(f"Backlog: held {count} press(es), {self.backlog.local} waiting locally")
+                self._refresh_backlog()
+                return
+
+            if self.btn.state == "offline": 
+                self.buffer_offline("trigger", count)
+                return
+
+            press_id = uuid.uuid4().hex
+            for sent in range(count):
+                try:
+                    if not self._post_api_trigger(f"{press_id}-{sent}"):
+                        break
+                except requests.ConnectionError as e:
+                    # Server went away between the health check and the press
+                    logging.error(f"Trigger request failed: {e}")
+                    self.buffer_offline("trigger", count - sent)
+                    break
+                    
+        except Exception as e:
+            logging.error(f"Trigger request failed: {e}")
+
+    def _post_api_trigger(self, key=None):
+        """
+        Sends a single trigger request. Returns True only if it reached a browser
+        (now or on an earlier attempt); False also means further sends are pointless.
+        `key` identifies this press: the server drops repeats of a key it has already
+        delivered, so a request that timed out can be resent without queueing twice.
+        """
+        # Prepare Payload
+        binding_code = self.config.get("binding_code", "")
+        target_id = self.browser_client_id
+        local_ip = self.get_local_ip()
+        key = key or uuid.uuid4().hex
+        
+        payload = {
+            "clientId": self.client_id,
+            "clientIp": local_ip,
+            "targetClientId": target_id,
+            "targetBindingId": binding_code,
+            "idempotencyKey": key
+        }
+        
+        logging.info(f"Sending API trigger to {self.trigger_url}. Payload: {payload}")
+        
+        retries = max(0, int(self.config.get("trigger_retries", 2)))
+        for attempt in range(retries + 1):
+            try:
+                resp = requests.post(self.trigger_url, json=payload, headers={"Idempotency-Key": key}, timeout=2)
+                break
+            except requests.Timeout:
+                if attempt == retries:
+                    raise
+                logging.warning(f"Trigger timed out, retrying with the same key ({attempt + 1}/{retries})")
+                time.sleep(0.5 * (attempt + 1))
+        logging.info(f"API Trigger Response: {resp.status_code}")
+        
+        if resp.status_code == 404:
+            logging.error("API Trigger 404 Not Found")
+            self.safe_alert("连接错误", "找不到触发端点 (404)。\n请确保已安装 RunButton 节点并重启 ComfyUI。", "error")
+            return False
+
+        if resp.status_code == 429:
+            # Shared server with fair-share quotas: the rest of this batch would be refused too
+            try: message = resp.json().get("message")
+            except ValueError: message = resp.text
+            logging.warning(f"Trigger refused by server quota: {message}")
+            return False
+
+        # Log server warnings if any
+        try:
+            r_json = resp.json()
+        except ValueError:
+            logging.error(f"Unexpected trigger response ({resp.status_code})")
+            return False
+        if r_json.get("status") == "warning":
+            logging.warning(f"Server Warning: {r_json.get('message')}")
+        elif r_json.get("duplicate"):
+            logging.info("Server already delivered this trigger (duplicate ignored)")
+        return r_json.get("status") == "triggered"
+
+    def start_sweep(self, grid, mode="product", front=False):
+        """
+        Asks the server to sweep the browser's current workflow over `grid`
+        (see sweep.py): the target browser posts its graph once and the server
+        queues every variant. Blocking; returns the server's JSON answer.
+        """
+        payload = {
+            "clientId": self.client_id,
+            "clientIp": self.get_local_ip(),
+            "targetClientId": self.browser_client_id,
+            "targetBindingId": self.config.get("binding_code", ""),
+            "grid": grid,
+            "mode": mode,
+            "front": bool(front),
+            "sweepId": uuid.uuid4().hex[:12],
+        }
+        logging.info(f"Requesting sweep {payload['sweepId']} ({mode}) over {list(grid)}")
+        resp = requests.post(self.sweep_url, json=payload, headers={"Idempotency-Key": payload["sweepId"]}, timeout=5)
+        if resp.status_code == 404:
+            return {"status": "error", "message": "Server has no sweep endpoint (update the RunButton node)"}
+        result = resp.json()
+        if result.get("status") != "requested":
+            logging.warning(f"Sweep request: {result.get('message')}")
+        return result
+
+    def set_sweep(self, data):
+        self.sweep = data
+        text = "" if data.get("done") else f"{data.get('k', 0)}/{data.get('n', 0)}"
+        if text != self.btn.sweep_text:
+            self.btn.sweep_text = text
+            self.btn.draw()
+        if data.get("done"):
+            logging.info(f"Sweep {data.get('sweep_id')} finished: {data.get('n')} runs, {data.get('failed', 0)} failed")
+
+    def send_interrupt(self):
+        threading.Thread(target=self._interrupt_worker, daemon=True).start()
+
+    def _interrupt_worker(self):
+        # Stop means stop: presses still held locally are dropped too
+        dropped = self.backlog.clear()
+        if dropped:
+            logging.info(f"Backlog: dropped {dropped} held press(es) on stop")
+            self._refresh_backlog()
+        if self.config.get("control_mode") == "extension":
+            self.send_extension_trigger(action="stop")
+            return
+        if self.btn.state == "offline":
+            self.buffer_offline("interrupt")
+            return
+        try: requests.post(self.interrupt_url, timeout=1)
+        except requests.ConnectionError:
+            self.buffer_offline("interrupt")
+        except: pass
+
+    # --- Offline Outbox ---
+    def buffer_offline(self, action, count=1):
+        if self.outbox.push(action, count):
+            logging.warning(f"Offline: buffered {action} (x{count}) for replay on reconnect")
+        else:
+            logging.info(f"Offline: {action} merged with buffered press")
+        self._refresh_outbox_badge()
+
+    def _refresh_outbox_badge(self):
+        pending = len(self.outbox)
+        def update():
+            self.btn.outbox_count = pending
+            self.btn.draw()
+        try: self.loop.after(0, update)
+        except: pass
+
+    def flush_outbox(self):
+        """Replays buffered presses in order. Stops at the first failure and keeps the rest."""
+        entries = self.outbox.pending()
+        if not entries:
+            self._refresh_outbox_badge()
+            return
+        logging.info(f"Reconnected: replaying {len(entries)} buffered action(s)")
+        for entry in entries:
+            if not self.ws_connected:
+                break
+            try:
+                if entry["action"] == "trigger":
+                    # Keys derive from the entry id, so a replay cut short and retried later is not doubled:
+                    # presses that already reached the browser come back as duplicates and are not run again
+                    delivered = all(self._post_api_trigger(f"{entry['id']}-{i}") for i in range(entry.get("count", 1)))
+                    if not delivered:
+                        logging.warning("Outbox replay not delivered to a browser, will retry")
+                        break
+                else:
+                    requests.post(self.interrupt_url, timeout=1)
+            except Exception as e:
+                logging.error(f"Outbox replay failed, will retry: {e}")
+                break
+            self.outbox.ack(entry["id"])
+            logging.info(f"Replayed buffered {entry['action']} from {time.strftime('%H:%M:%S', time.localtime(entry['ts']))}")
+        self._refresh_outbox_badge()
+
+    # --- Backlog (Admission Control) ---
+    def _refresh_backlog(self):
+        """Releases what the server queue has room for and updates the badge. Any thread."""
+        def update():
+            self.btn.backlog_count = self.backlog.local
+            self.btn.draw()
+            self.release_backlog()
+        try: self.loop.after(0, update)
+        except: pass
+
+    def release_backlog(self):
+        """Main thread. Starts a release worker if presses are waiting and none is running."""
+        if self._backlog_releasing or not self.backlog.local or not self.ws_connected:
+            return
+        self._backlog_releasing = True
+        threading.Thread(target=self._backlog_worker, daemon=True).start()
+
+    def _backlog_worker(self):
+        released = 0
+        expired = self.backlog.expired
+        try:
+            while self.ws_connected and self.backlog.take():
+                try:
+                    if not self._post_api_trigger():
+                        self.backlog.give_back()
+                        break
+                except Exception as e:
+                    logging.error(f"Backlog release failed, will retry: {e}")
+                    self.backlog.give_back()
+                    break
+                released += 1
+        finally:
+            self._backlog_releasing = False
+        if self.backlog.expired > expired:
+            logging.warning(f"Backlog: {self.backlog.expired - expired} release(s) not confirmed by the queue "
+                            f"within {self.backlog.ack_timeout:g}s, not sent again")
+        if released:
+            logging.info(f"Backlog: released {released}, {self.backlog.local} still held (server queue {self.backlog.remote})")
+            self._refresh_backlog()
+
+    # --- Hotkey Management ---
+    def setup_hotkey(self):
+        if not self.hotkeys:
+            return
+        actions = {
+            "run": self.send_trigger,
+            "run_batch": self.send_batch_trigger,
+            "stop": self.send_interrupt,
+            "toggle": self.toggle_smart,
+        }
+        debounce_ms = DEFAULT_CONFIG["hotkey_debounce_ms"].copy()
+        debounce_ms.update(self.config.get("hotkey_debounce_ms") or {})
+
+        bindings = []
+        for name, config_key in HOTKEY_CONFIG_KEYS.items():
+            combo = (self.config.get(config_key) or "").strip()
+            if not combo:
+                continue
+            try:
+                bindings.append(Binding(name, combo, actions[name], debounce_ms.get(name, 500) / 1000.0))
+            except ValueError as e:
+                self.handle_hotkey_conflict(config_key, combo, str(e))
+
+        failures = self.hotkeys.apply(bindings)
+        for binding, error in failures:
+            logging.error(f"Hotkey registration failed: {error}")
+            self.handle_hotkey_conflict(HOTKEY_CONFIG_KEYS[binding.name], binding.combo, str(error))
+
+    def handle_hotkey_conflict(self, key_name, hotkey, error_msg):
+        logging.error(f"Hotkey conflict detected for {key_name} ({hotkey}): {error_msg}")
+
+    # --- Connectivity & Network ---
+    
+    def connection_manager_loop(self):
+        """Monitors connection state and handles auto-reconnect"""
+        while True:
+            is_ext_mode = self.config.get("control_mode") == "extension"
+            
+            if is_ext_mode:
+                # Extension Mode Logic
+                if self.ws:
+                    try: self.ws.close()
+                    except: pass
+                    self.ws = None
+                    self.ws_connected = False
+                
+                if self.btn.state == "offline":
+                     self.loop.after(0, lambda: self.btn.set_state("idle"))
+                
+                time.sleep(1)
+                continue
+
+            # API Mode Logic
+            try:
+                self.check_server()
+                # Server is Up
+                if not self.ws_connected:
+                    self.start_ws()
+            except:
+                # Server is Down
+                self.ws_connected = False
+                self.loop.after(0, lambda: self.btn.set_state("offline"))
+
+            # Replay presses buffered during the outage as soon as the socket is back
+            if self.ws_connected and len(self.outbox):
+                self.flush_outbox()
+            
+            if self._ws_opened.wait(3):
+                self._ws_opened.clear()
+
+    def check_server(self):
+        """Health check. Raises if the server is unreachable. Unchanged stats come back as an empty 304."""
+        headers = {"If-None-Match": self.stats_etag} if self.stats_etag else {}
+        resp = requests.get(self.stats_url, headers=headers, timeout=2)
+        if resp.status_code == 404 and self.stats_url != self.legacy_stats_url:
+            logging.info("Server has no /run_button/system_stats, using /system_stats")
+            self.stats_url = self.legacy_stats_url
+            resp = requests.get(self.stats_url, timeout=2)
+        if resp.status_code == 200:
+            self.stats_etag = resp.headers.get("ETag")
+            try: self.system_stats = resp.json()
+            except ValueError: pass
+
+    def start_ws(self):
+        threading.Thread(target=self._ws_worker, daemon=True).start()
+
+    def _ws_worker(self):
+        try:
+            self.client_id = f"run_button_observer_{uuid.uuid4()}"
+            ws_url = f"{self.ws_url}?clientId={self.client_id}"
+            self.ws_decoder = None
+            encoding = self.config.get("observer_encoding", "json")
+            if encoding in ("compact", "binary") and not self.observer_fallback:
+                # Negotiated stream; the server's first message says what it agreed to
+                zlib_flag = 1 if self.config.get("observer_compress", True) else 0
+                ws_url = f"{self.observer_url}?clientId={self.client_id}&encoding={encoding}&zlib={zlib_flag}"
+                self.ws_decoder = ObserverDecoder()
+            
+            self.ws = websocket.WebSocketApp(
+                ws_url,
+                on_open=self.on_ws_open,
+                on_message=self.on_ws_message,
+                on_error=self.on_ws_error,
+                on_close=self.on_ws_close
+            )
+            self.ws.run_forever()
+        except: pass
+        self.ws_connected = False
+
+    def on_ws_open(self, ws):
+        self.ws_connected = True
+        self._ws_opened.set()
+        self.loop.after(0, lambda: self.btn.set_state("idle"))
+
+    def on_ws_error(self, ws, error):
+        self.ws_connected = False
+        if self.ws_decoder and getattr(error, "status_code", None) == 404:
+            # Older server without /run_button/observer: use the plain JSON stream from now on
+            logging.warning("Server has no negotiated observer endpoint, falling back to /ws")
+            self.observer_fallback = True
+
+    def on_ws_close(self, ws, close_status_code, close_msg):
+        self.ws_connected = False
+        if self.config.get("control_mode") != "extension":
+             self.loop.after(0, lambda: self.btn.set_state("offline"))
+
+    def on_ws_message(self, ws, message):
+        if self.ws_decoder:
+            self.on_observer_message(message)
+            return
+        if self.recorder: self.recorder.record("ws", message)
+        try:
+            msg = json.loads(message)
+            self.loop.after(0, lambda: self.handle_ws_event(msg.get("type"), msg.get("data", {})))
+        except: pass
+
+    def on_observer_message(self, message):
+        try:
+            events = self.ws_decoder.feed(message)
+        except Exception as e:
+            logging.error(f"Failed to decode observer message: {e}")
+            return
+        if not events:
+            return
+        if self.recorder:
+            # Recordings stay in the plain /ws format so they replay the same way
+            for mtype, data in events:
+                self.recorder.record("ws", json.dumps({"type": mtype, "data": data}))
+        self.loop.after(0, lambda: self.handle_ws_events(events))
+
+    def handle_ws_events(self, events):
+        """Applies a batch of events with a single redraw."""
+        self.btn.hold_draw = True
+        try:
+            for mtype, data in events:
+                try: self.handle_ws_event(mtype, data)
+                except Exception as e: logging.error(f"Failed to handle {mtype} event: {e}")
+        finally:
+            self.btn.hold_draw = False
+            self.btn.draw()
+
+    def handle_ws_event(self, mtype, data):
+        # Dispatch status updates to UI
+        if mtype == "status":
+            exec_info = data.get("status", {}).get("exec_info", {})
+            queue = exec_info.get("queue_remaining", 0) or 0
+            self.backlog.on_queue(queue)
+            if queue > 0:
+                self.btn.set_state("running", self.btn.progress, queue)
+            # If queue is 0, we rely on executing/progress events
+            self.release_backlog()
+            
+        elif mtype == "execution_start":
+            self.btn.set_state("running", 0.0, self.btn.queue_count)
+
+        elif mtype == "execution_error" or mtype == "execution_interrupted":
+             self.btn.set_state("idle", 0.0, 0)
+
+        elif mtype == "progress":
+            val = data.get("value", 0)
+            max_val = data.get("max", 100)
+            pct = val / max_val if max_val > 0 else 0.0
+            self.btn.set_state("running", pct, self.btn.queue_count)
+
+        elif mtype == "executing":
+            if data.get("node") is None:
+                if self.btn.queue_count == 0:
+                    self.btn.set_state("idle", 0.0, 0)
+            else:
+                self.btn.set_state("running", self.btn.progress, self.btn.queue_count)
+
+        elif mtype == "run_button.eta":
+            self.set_eta(data)
+
+        elif mtype == "run_button.preview":
+            self.set_preview(data)
+
+        elif mtype == "run_button.system_stats":
+            self.system_stats = data
+
+        elif mtype == "run_button.sweep":
+            self.set_sweep(data)
+
+        elif mtype == "ext_log":
+            level = data.get("level", "info")
+            msg = data.get("message", "")
+            if level == "error": logging.error(f"[ChromeExt] {msg}")
+            elif level == "warn": logging.warning(f"[ChromeExt] {msg}")
+            else: logging.info(f"[ChromeExt] {msg}")
+
+    # --- ETA ---
+    @staticmethod
+    def format_duration(seconds):
+        seconds = int(max(0, seconds))
+        if seconds >= 3600:
+            return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+        return f"{seconds // 60}:{seconds % 60:02d}"
+
+    def set_eta(self, data):
+        now = time.monotonic()
+        remaining = data.get("remaining")
+        # Without history for this workflow there is nothing meaningful to show
+        if remaining is None or not data.get("samples"):
+            self.eta_deadline = None
+        else:
+            self.eta_deadline = now + remaining
+        queue_left = data.get("queue_remaining")
+        self.queue_eta_deadline = now + queue_left if queue_left and data.get("queue_known") else None
+        self._update_eta_text()
+
+    def _update_eta_text(self):
+        now = time.monotonic()
+        eta = self.format_duration(self.eta_deadline - now) if self.eta_deadline else ""
+        queue_eta = self.format_duration(self.queue_eta_deadline - now) if self.queue_eta_deadline and self.btn.queue_count > 0 else ""
+        if (eta, queue_eta) != (self.btn.eta_text, self.btn.queue_eta_text):
+            self.btn.eta_text, self.btn.queue_eta_text = eta, queue_eta
+            self.btn.draw()
+
+    def _eta_tick(self):
+        # Counts the ETA down locally between server updates
+        if self.btn.state != "running":
+            self.eta_deadline = self.queue_eta_deadline = None
+        self._update_eta_text()
+        # Also picks up releases whose status update never arrived
+        self.release_backlog()
+        self.loop.after(1000, self._eta_tick)
+
+    # --- Local State Relay ---
+    def get_relay_state(self):
+        """Derived app state for relay consumers. Called on relay threads; only reads plain attributes."""
+        now = time.monotonic()
+        btn = self.btn
+        return {
+            "state": btn.state,
+            "connected": bool(self.ws_connected),
+            "extension_connected": bool(self.extension_connected),
+            "control_mode": self.config.get("control_mode", "api"),
+            "progress": round(btn.progress, 3),
+            "queue_remaining": btn.queue_count,
+            "backlog": btn.backlog_count,
+            "outbox": btn.outbox_count,
+            "eta": round(self.eta_deadline - now, 1) if self.eta_deadline else None,
+            "queue_eta": round(self.queue_eta_deadline - now, 1) if self.queue_eta_deadline else None,
+            "sweep": self.sweep,
+            "browser_client_id": self.browser_client_id,
+            "browser_tabs": len(self.browser_tabs),
+            "rss_mb": round(process_rss_mb() or 0),
+        }
+
+    def handle_relay_command(self, cmd, args):
+        if cmd == "trigger":
+            try: count = max(1, min(100, int(args.get("count", 1))))
+            except (TypeError, ValueError): count = 1
+            self.send_trigger(count)
+            return {"status": "ok", "count": count}
+        if cmd == "sweep":
+            if not isinstance(args.get("grid"), dict) or not args["grid"]:
+                return {"status": "error", "message": "Missing parameter grid"}
+            return self.start_sweep(args["grid"], args.get("mode") or "product", args.get("front", False))
+        self.send_interrupt()
+        return {"status": "ok"}
+
+    # --- Extension Server (Sidecar) ---
+    def start_sidecar_server(self):
+        """Browser handshake server: ComfyUI tabs push their client id over a kept-open socket"""
+        try:
+            start_sidecar(self.browser_tabs, allowed_origins=self.sidecar_origins)
+        except OSError as e:
+            print(f"Sidecar server failed to start (Port 56789 busy?): {e}")
+
+    def on_browser_target(self, client_id):
+        self.browser_client_id = client_id
+        if self.relay: self.relay.notify()
+
+    def start_extension_ws_server(self):
+        """Raw WebSocket Server for Extension Communication"""
+        HOST, PORT = '127.0.0.1', 56790
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server_socket.bind((HOST, PORT))
+            server_socket.listen(1)
+        except Exception as e:
+            # logging.error(f"Failed to bind Extension WS Server on {PORT}: {e}")
+            return
+
+        while True:
+            try:
+                client_socket, addr = server_socket.accept()
+                threading.Thread(target=self.handle_extension_client, args=(client_socket,), daemon=True).start()
+            except Exception as e:
+                # logging.error(f"Accept failed: {e}")
+                time.sleep(1) # Wait before retry if accept fails
+
+    def handle_extension_client(self, client_socket):
+        try:
+            # Handshake
+            data = client_socket.recv(1024)
+            key = None
+            for line in data.decode().split('\r\n'):
+                if 'Sec-WebSocket-Key' in line:
+                    key = line.split(': ')[1]
+                    break
+            
+            if key:
+                resp_key = ws_accept_key(key)
+                response = f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: {resp_key}\r\n\r\n"
+                client_socket.send(response.encode())
+                
+                self.extension_socket = client_socket
+                self.extension_connected = True
+                
+                # Frame Loop
+                read_exact = socket_reader(client_socket)
+                message = bytearray()
+                while True:
+                    fin, opcode, payload = ws_read_frame(read_exact)
+                    if opcode == 0x8: # Close
+                        break
+                    if opcode == 0x9: # Ping -> Pong
+                        client_socket.send(ws_frame(payload, opcode=0xA))
+                        continue
+                    if opcode not in (0x0, 0x1):
+                        continue
+                    message.extend(payload)
+                    if not fin:
+                        continue
+                        
+                    self.dispatch_extension_message(message.decode('utf-8', 'replace'))
+                    message = bytearray()
+                    
+        except: pass
+        finally:
+            if self.extension_socket == client_socket:
+                self.extension_socket = None
+                self.extension_connected = False
+            try: client_socket.close()
+            except: pass
+
+    def dispatch_extension_message(self, text):
+        if self.recorder: self.recorder.record("ext", text)
+        try:
+            msg = json.loads(text)
+            if msg.get("type") == "batch":
+                events = [expand_compact_event(ev) for ev in msg.get("events", [])]
+            else:
+                events = [(msg.get("type"), msg.get("data", {}))]
+            self.loop.after(0, lambda ev=events: self.handle_ws_events(ev))
+        except: pass
+
+    def send_extension_trigger(self, action="trigger"):
+        if not self.extension_socket:
+            logging.warning("Extension trigger failed: Socket not connected")
+            self.safe_alert("插件未连接", "浏览器插件未连接！\n请检查 Chrome 插件状态。", "warning")
+            return
+
+        try:
+            msg = json.dumps({"type": action})
+            self.extension_socket.send(ws_frame(msg))
+            logging.info(f"Extension trigger sent: {action}")
+        except Exception as e:
+            logging.error(f"Extension send failed: {e}")
+            self.extension_socket = None
+
+    # --- Utils ---
+    def get_local_ip(self):
+        try:
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.connect(("8.8.8.8", 80))
+            IP = s.getsockname()[0]
+            s.close()
+            return IP
+        except: return "127.0.0.1"
+
+    def toggle_smart(self):
+        if self.btn.state == "running": self.send_interrupt()
+        else: self.send_trigger()
+
+    def acquire_instance_lock(self, port=65432):
+        """
+        Single Instance Check & Auto-Kill.
+        We bind a local socket to ensure only one instance is running.
+        If binding fails, another instance is holding the port: we try to find
+        and kill that process, then bind again. Returns False if that failed.
+        """
+        self.lock_port = port
+        self._lock_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self._lock_socket.bind(('127.0.0.1', self.lock_port))
+            return True
+        except socket.error:
+            print(f"Port {self.lock_port} is busy. Attempting to kill previous instance...")
+
+        import psutil
+        my_pid = os.getpid()
+
+        # Find who is holding our port
+        target_pid = None
+        try:
+            for proc in psutil.process_iter(['pid', 'name']):
+                try:
+                    for conn in proc.connections(kind='udp'):
+                        if conn.laddr.port == self.lock_port:
+                            target_pid = proc.pid
+                            break
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+                if target_pid: break
+        except: pass
+
+        if target_pid and target_pid != my_pid:
+            try:
+                p = psutil.Process(target_pid)
+                p.terminate()
+                p.wait(timeout=3) # Wait for it to die
+                print(f"Killed previous instance (PID: {target_pid})")
+            except Exception as e:
+                print(f"Failed to kill process {target_pid}: {e}")
+
+        try:
+            self._lock_socket.bind(('127.0.0.1', self.lock_port))
+            print("Successfully bound to lock port after cleanup.")
+            return True
+        except socket.error:
+            return False
+
+    def shutdown(self):
+        if self.recorder: self.recorder.close()
+        if self.relay: self.relay.stop()
+        if self.hotkeys:
+            try:
+                logging.info(self.hotkeys.latency_report())
+                self.hotkeys.stop()
+            except: pass
+
+
+# --- Headless Daemon & CLI ---
+
+class RunDaemon(RunEngine):
+    """The engine on a HeadlessLoop: no window, controlled through the relay."""
+    def __init__(self, hotkeys=False):
+        loop = HeadlessLoop()
+        if not self.acquire_instance_lock():
+            logging.error("Another Run Button instance is running and could not be stopped.")
+            sys.exit(1)
+        super().__init__(loop, hotkeys=hotkeys)
+
+    def run(self):
+        def stop(*_):
+            self.loop.quit()
+        signal.signal(signal.SIGINT, stop)
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, stop)
+        rss = process_rss_mb()
+        logging.info(f"Run Button daemon running (relay port {self.config.get('relay_port')}, "
+                     f"{rss if rss is not None else '?'} MB resident)")
+        try:
+            self.loop.mainloop()
+        finally:
+            self.shutdown()
+
+
+def relay_request(port, path, body=None, timeout=5):
+    """CLI side: talks to a running app or daemon through its local relay."""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data,
+                                 headers={"Content-Type": "application/json"} if data is not None else {})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Button engine (headless daemon and control CLI)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    daemon = sub.add_parser("daemon", help="Run without a window")
+    daemon.add_argument("--hotkeys", action="store_true", help="Also register the global hotkeys")
+    trigger = sub.add_parser("trigger", help="Queue the current workflow")
+    trigger.add_argument("--count", type=int, default=1)
+    sweep = sub.add_parser("sweep", help="Queue every combination of a parameter grid over the current workflow")
+    sweep.add_argument("grid", help='JSON, e.g. \'{"3.seed": [1, 2, 3], "cfg": {"start": 4, "stop": 8, "step": 1}}\'')
+    sweep.add_argument("--zip", action="store_true", help="Pair the i-th values instead of all combinations")
+    sweep.add_argument("--front", action="store_true", help="Queue ahead of waiting prompts")
+    sub.add_parser("stop", help="Interrupt (and drop the local backlog)")
+    sub.add_parser("status", help="Print the current state as JSON")
+    parser.add_argument("--port", type=int, default=None, help="Relay port (default: relay_port from config.json)")
+    args = parser.parse_args(argv)
+
+    if args.command == "daemon":
+        RunDaemon(hotkeys=args.hotkeys).run()
+        return 0
+
+    port = args.port
+    if port is None:
+        config = DEFAULT_CONFIG.copy()
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                config.update(json.load(f))
+        except (OSError, ValueError): pass
+        port = config.get("relay_port") or DEFAULT_CONFIG["relay_port"]
+    try:
+        if args.command == "status":
+            result = relay_request(port, "/state")
+        elif args.command == "trigger":
+            result = relay_request(port, "/trigger", {"count": args.count})
+        elif args.command == "sweep":
+            try:
+                grid = json.loads(args.grid)
+            except ValueError as e:
+                print(f"Invalid grid JSON: {e}", file=sys.stderr)
+                return 2
+            result = relay_request(port, "/sweep", {"grid": grid, "mode": "zip" if args.zip else "product", "front": args.front}, timeout=10)
+        else:
+            result = relay_request(port, "/stop", {})
+    except OSError as e:
+        print(f"Run Button is not running (relay on port {port}): {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0 if result.get("status") != "error" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Run history for the Run Button server extension.
+
+Execution events are timestamped on the executor thread and handed to a
+single writer thread, which turns them into rows in a small SQLite database:
+
+  runs          one row per prompt (workflow hash, start/end, outcome)
+  node_runs     per-node durations of each run (cached nodes included, flagged)
+  workflow_stats  running aggregates per workflow, kept across compaction
+
+The workflow hash only covers graph structure (node classes + links), so the
+same workflow with a different seed or prompt text is the same workflow.
+Raw rows are pruned by a retention policy; aggregates are not.
+"""
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+
+HISTORY_EVENTS = ("execution_start", "execution_cached", "executing", "execution_success",
+                  "execution_error", "execution_interrupted")
+# Not stored, only passed on to listeners (e.g. the ETA estimator)
+LISTENER_EVENTS = ("progress", "status")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    prompt_id TEXT UNIQUE,
+    workflow_hash TEXT,
+    started REAL,
+    ended REAL,
+    outcome TEXT,
+    node_count INTEGER DEFAULT 0,
+    cached_count INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_by_workflow ON runs(workflow_hash, started DESC);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs(started);
+
+CREATE TABLE IF NOT EXISTS node_runs (
+    run_id INTEGER,
+    node_id TEXT,
+    class_type TEXT,
+    started REAL,
+    duration REAL,
+    cached INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS node_runs_by_run ON node_runs(run_id);
+-- Covers slowest_node_classes: cached = 0 first (equality), then the started range
+DROP INDEX IF EXISTS node_runs_by_time;
+CREATE INDEX IF NOT EXISTS node_runs_by_cached_time ON node_runs(cached, started, class_type, duration);
+
+CREATE TABLE IF NOT EXISTS workflow_stats (
+    workflow_hash TEXT PRIMARY KEY,
+    runs INTEGER DEFAULT 0,
+    successes INTEGER DEFAULT 0,
+    total_duration REAL DEFAULT 0,
+    last_run REAL
+);
+"""
+
+
+def workflow_hash(prompt):
+    """Structure-only hash of an API-format prompt (widget values are ignored)."""
+    parts = []
+    for node_id in sorted(prompt, key=str):
+        node = prompt[node_id] or {}
+        links = sorted(
+            (name, str(value[0]), value[1])
+            for name, value in (node.get("inputs") or {}).items()
+            if isinstance(value, list) and len(value) == 2
+        )
+        parts.append((str(node_id), node.get("class_type"), links))
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class RunHistory:
+    """
+    feed() is safe to call from the executor thread: it only enqueues.
+    prompt_lookup(prompt_id) returns the API-format prompt of a running prompt (or None).
+    """
+    def __init__(self, path, prompt_lookup=None, retention_days=30, run_retention_days=365,
+                 max_runs=200000, compact_interval=6 * 3600):
+        self.path = path
+        self.prompt_lookup = prompt_lookup
+        self.retention_days = retention_days
+        self.run_retention_days = run_retention_days
+        self.max_runs = max_runs
+        self.compact_interval = compact_interval
+        self.listeners = []  # Called on the writer thread as fn(event, data, ts, run)
+
+        self._queue = queue.Queue(maxsize=10000)
+        self._current = None  # In-flight run state
+        self._last_compact = 0.0
+        self._init_db()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="RunButtonHistory")
+        self._thread.start()
+
+    # --- Storage ---
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        conn = sqlite3.connect(self.path)
+        # Must be set before the first table is created to take effect
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+
+    # --- Ingestion ---
+    def feed(self, event, data):
+        if event not in HISTORY_EVENTS and (event not in LISTENER_EVENTS or not self.listeners):
+            return
+        try:
+            self._queue.put_nowait((event, data, time.time()))
+        except queue.Full:
+            pass # History is best-effort; never stall the executor
+
+    def _loop(self):
+        conn = self._connect()
+        while True:
+            event, data, ts = self._queue.get()
+            try:
+                self._handle(conn, event, data or {}, ts)
+            except Exception as e:
+                print(f"[RunButton] History error on {event}: {e}")
+            if self._queue.empty():
+                conn.commit()
+                if ts - self._last_compact > self.compact_interval:
+                    self._last_compact = ts
+                    try: self.compact(conn)
+                    except Exception as e: print(f"[RunButton] History compaction failed: {e}")
+
+    def _handle(self, conn, event, data, ts):
+        prompt_id = data.get("prompt_id")
+        run = self._current
+
+        if event in LISTENER_EVENTS:
+            self._notify(event, data, ts, run)
+            return
+
+        if event == "execution_start":
+            if run:
+                self._finish(conn, run, ts, "abandoned")
+            prompt = self.prompt_lookup(prompt_id) if self.prompt_lookup else None
+            classes = {str(k): (v or {}).get("class_type") for k, v in (prompt or {}).items()}
+            run = {
+                "prompt_id": prompt_id,
+                "workflow_hash": workflow_hash(prompt) if prompt else None,
+                "classes": classes,
+                "started": ts,
+                "node": None,
+                "node_started": ts,
+                "nodes": [],   # (node_id, class_type, started, duration, cached)
+            }
+            self._current = run
+
+        elif run is None or (prompt_id and prompt_id != run["prompt_id"]):
+            return
+
+        elif event == "execution_cached":
+            for node_id in data.get("nodes") or []:
+                node_id = str(node_id)
+                run["nodes"].append((node_id, run["classes"].get(node_id), ts, 0.0, 1))
+
+        elif event == "executing":
+            self._close_node(run, ts)
+            node = data.get("node")
+            if node is None:
+                self._finish(conn, run, ts, "success")
+            else:
+                run["node"] = str(node)
+                run["node_started"] = ts
+
+        elif event == "execution_success":
+            self._finish(conn, run, ts, "success")
+
+        elif event in ("execution_error", "execution_interrupted"):
+            self._finish(conn, run, ts, "error" if event == "execution_error" else "interrupted")
+
+        self._notify(event, data, ts, run)
+
+    def _notify(self, event, data, ts, run):
+        for listener in self.listeners:
+            try: listener(event, data, ts, run)
+            except Exception as e: print(f"[RunButton] History listener failed: {e}")
+
+    def _close_node(self, run, ts):
+        if run["node"] is not None:
+            run["nodes"].append((run["node"], run["classes"].get(run["node"]), run["node_started"], ts - run["node_started"], 0))
+            run["node"] = None
+
+    def _finish(self, conn, run, ts, outcome):
+        if self._current is not run:
+            return
+        self._close_node(run, ts)
+        self._current = None
+        run["outcome"] = outcome
+        run["ended"] = ts
+
+        cached = sum(1 for n in run["nodes"] if n[4])
+        cur = conn.execute(
+            "INSERT OR REPLACE INTO runs (prompt_id, workflow_hash, started, ended, outcome, node_count, cached_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run["prompt_id"], run["workflow_hash"], run["started"], ts, outcome, len(run["nodes"]), cached))
+        run_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO node_runs (run_id, node_id, class_type, started, duration, cached) VALUES (?, ?, ?, ?, ?, ?)",
+            [(run_id,) + n for n in run["nodes"]])
+        if run["workflow_hash"]:
+            conn.execute(
+                "INSERT INTO workflow_stats (workflow_hash, runs, successes, total_duration, last_run) VALUES (?, 1, ?, ?, ?) "
+                "ON CONFLICT(workflow_hash) DO UPDATE SET runs = runs + 1, successes = successes + excluded.successes, "
+                "total_duration = total_duration + excluded.total_duration, last_run = excluded.last_run",
+                (run["workflow_hash"], 1 if outcome == "success" else 0, ts - run["started"], ts))
+
+    # --- Retention ---
+    def compact(self, conn=None):
+        """Drops node rows past retention, old runs beyond the run cap, then reclaims pages."""
+        own = conn is None
+        conn = conn or self._connect()
+        now = time.time()
+        conn.execute("DELETE FROM node_runs WHERE started < ?", (now - self.retention_days * 86400,))
+        conn.execute("DELETE FROM runs WHERE started < ?", (now - self.run_retention_days * 86400,))
+        conn.execute("DELETE FROM runs WHERE id <= (SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?)", (self.max_runs,))
+        conn.execute("DELETE FROM node_runs WHERE run_id < (SELECT MIN(id) FROM runs)")
+        conn.commit()
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if own:
+            conn.close()
+
+    # --- Queries (any thread) ---
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(r) for r in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def recent_runs(self, workflow=None, limit=1000):
+        if workflow:
+            return self._query("SELECT * FROM runs WHERE workflow_hash = ? ORDER BY started DESC LIMIT ?", (workflow, limit))
+        return self._query("SELECT * FROM runs ORDER BY started DESC LIMIT ?", (limit,))
+
+    def run_nodes(self, prompt_id):
+        return self._query(
+            "SELECT n.node_id, n.class_type, n.started, n.duration, n.cached FROM node_runs n "
+            "JOIN runs r ON r.id = n.run_id WHERE r.prompt_id = ? ORDER BY n.started", (prompt_id,))
+
+    def slowest_node_classes(self, days=7, limit=20):
+        return self._query(
+            "SELECT class_type, COUNT(*) AS runs, AVG(duration) AS avg_duration, MAX(duration) AS max_duration, "
+            "SUM(duration) AS total_duration FROM node_runs WHERE started >= ? AND cached = 0 "
+            "GROUP BY class_type ORDER BY avg_duration DESC LIMIT ?", (time.time() - days * 86400, limit))
+
+    def workflow_stats(self, limit=100):
+        return self._query(
+            "SELECT workflow_hash, runs, successes, total_duration / runs AS avg_duration, last_run "
+            "FROM workflow_stats ORDER BY last_run DESC LIMIT ?", (limit,))
@@ -0,0 +1,163 @@
+"""
+Local state relay for the desktop app.
+
+FloatApp already holds the one observer connection to ComfyUI and derives
+the button state from it. The relay re-publishes that state on localhost so
+stream decks, tray widgets and scripts can follow it (and press Run/Stop)
+without each opening their own websocket to the ComfyUI server.
+
+    GET  /state            current snapshot (JSON)
+    POST /trigger          {"count": n} (optional)   -> same path as a hotkey press
+    POST /stop             -> same path as the Stop button
+    POST /sweep            {"grid": {...}, "mode": "product" | "zip"} -> server-side sweep
+                           of the browser's current workflow (see sweep.py)
+    GET  /ws               websocket: snapshot on connect, then every change;
+                           accepts {"cmd": "trigger" | "stop", "count": n}
+
+Only binds to 127.0.0.1. Commands must come as JSON (which browsers cannot
+send cross-site without a preflight we never answer), and websocket upgrades
+from web pages are refused unless their Origin is explicitly allowed.
+Stdlib only.
+"""
+import json
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer
+
+from ws_util import WebSocketRequestHandler, ws_frame
+
+RELAY_COMMANDS = ("trigger", "stop", "sweep")
+
+
+class StateRelay:
+    """
+    get_state(): dict snapshot, called on the relay threads (must be cheap and thread-safe)
+    on_command(cmd, args): called for trigger/stop/sweep requests; returns a dict result
+    """
+    def __init__(self, get_state, on_command, host="127.0.0.1", port=56791,
+                 allowed_origins=(), min_interval=0.1):
+        self.get_state = get_state
+        self.on_command = on_command
+        self.host, self.port = host, port
+        self.allowed_origins = set(allowed_origins or ())
+        self.min_interval = min_interval
+        self.server = None
+        self._clients = set()           # Handlers with an open websocket
+        self._clients_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._last_sent = None
+
+    def __len__(self):
+        with self._clients_lock:
+            return len(self._clients)
+
+    def start(self):
+        relay = self
+
+        class Handler(RelayHandler):
+            pass
+        Handler.relay = relay
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logging.error(f"State relay failed to start on {self.host}:{self.port}: {e}")
+            return False
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="RelayHTTP").start()
+        threading.Thread(target=self._sender_loop, daemon=True, name="RelaySender").start()
+        logging.info(f"State relay listening on {self.host}:{self.port}")
+        return True
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server = None
+
+    def notify(self):
+        """Marks the state as changed. Cheap; call it from anywhere on every state change."""
+        self._changed.set()
+
+    # --- Fan-out ---
+    def _sender_loop(self):
+        # Latest state wins: bursts of changes (progress) collapse into one message per interval
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            with self._clients_lock:
+                clients = list(self._clients)
+            if clients:
+                try:
+                    text = json.dumps({"type": "state", "data": self.get_state()})
+                except Exception as e:
+                    logging.error(f"State relay snapshot failed: {e}")
+                    text = None
+                if text and text != self._last_sent:
+                    self._last_sent = text
+                    frame = ws_frame(text)
+                    for client in clients:
+                        client.send_frame(frame)
+            time.sleep(self.min_interval)
+
+    def _add_client(self, handler):
+        with self._clients_lock:
+            self._clients.add(handler)
+
+    def _remove_client(self, handler):
+        with self._clients_lock:
+            self._clients.discard(handler)
+
+    def command(self, cmd, args):
+        if cmd not in RELAY_COMMANDS:
+            return {"status": "error", "message": f"Unknown command {cmd!r}"}
+        try:
+            return self.on_command(cmd, args) or {"status": "ok"}
+        except Exception as e:
+            logging.error(f"Relay command {cmd} failed: {e}")
+            return {"status": "error", "message": str(e)}
+
+
+class RelayHandler(WebSocketRequestHandler):
+    relay = None
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/ws" and self.is_websocket_request():
+            self._websocket()
+        elif path == "/state":
+            self._json(self.relay.get_state())
+        else:
+            self._json({"status": "error", "message": "Not found"}, 404)
+
+    def do_POST(self):
+        cmd = self.path.split("?", 1)[0].strip("/")
+        if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+            self._json({"status": "error", "message": "Content-Type must be application/json"}, 415)
+            return
+        args = self._read_json_body()
+        if args is None:
+            self._json({"status": "error", "message": "Invalid JSON"}, 400)
+            return
+        result = self.relay.command(cmd, args if isinstance(args, dict) else {})
+        self._json(result, 404 if "Unknown command" in result.get("message", "") else 200)
+
+    def _websocket(self):
+        origin = self.headers.get("Origin")
+        if origin and origin.startswith(("http://", "https://")) and origin not in self.relay.allowed_origins:
+            self._json({"status": "error", "message": "Origin not allowed"}, 403)
+            return
+        self.accept_websocket()
+        self.send_text(json.dumps({"type": "state", "data": self.relay.get_state()}))
+        self.relay._add_client(self)
+        try:
+            self.serve_websocket(self._on_message)
+        finally:
+            self.relay._remove_client(self)
+
+    def _on_message(self, text):
+        try:
+            msg = json.loads(text)
+            result = self.relay.command(msg.get("cmd"), msg)
+        except (ValueError, AttributeError):
+            result = {"status": "error", "message": "Invalid JSON"}
+        self.send_text(json.dumps({"type": "result", "data": result}))
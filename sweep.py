@@ -0,0 +1,283 @@
+"""
+Server-side parameter sweeps.
+
+A sweep is one workflow (API format) plus a grid of input values. The server
+expands every variant, validates them all and inserts them into ComfyUI's
+queue in one pass, so a 200-variant sweep is one request instead of 200
+widget edits and browser round trips. Grid keys name an input either on one
+node ("3.seed") or on every node that has it as a literal value ("cfg"):
+
+    {"grid": {"3.seed": [1, 2, 3], "cfg": {"start": 4, "stop": 8, "step": 0.5}},
+     "mode": "product" | "zip"}
+
+"product" runs every combination, "zip" pairs the i-th values of each key.
+Progress goes to observers as `run_button.sweep`:
+
+    {"sweep_id", "k" (finished), "n" (total), "running" (1-based or None),
+     "params" (of the running variant), "failed", "done"}
+
+The tracker is a RunHistory listener, so it runs on the history writer thread.
+"""
+import json
+import heapq
+import time
+import uuid
+import inspect
+import asyncio
+import threading
+import itertools
+from collections import OrderedDict
+
+SWEEP_EVENT = "run_button.sweep"
+SWEEP_MODES = ("product", "zip")
+MAX_RANGE_VALUES = 10000
+
+
+class SweepError(ValueError):
+    pass
+
+
+def _range_values(spec):
+    try:
+        start, stop = float(spec["start"]), float(spec["stop"])
+        step = float(spec.get("step", 1))
+    except (KeyError, TypeError, ValueError):
+        raise SweepError(f"Range needs numeric start/stop/step: {spec!r}")
+    if step <= 0 or stop < start:
+        raise SweepError(f"Empty range: {spec!r}")
+    count = int((stop - start) / step + 1e-9) + 1
+    if count > MAX_RANGE_VALUES:
+        raise SweepError(f"Range has too many values ({count})")
+    as_int = all(isinstance(spec.get(k, 1), int) for k in ("start", "stop", "step"))
+    values = [start + i * step for i in range(count)]
+    return [int(v) for v in values] if as_int else [round(v, 10) for v in values]
+
+
+def _resolve_targets(prompt, key):
+    """(node_id, input_name) pairs a grid key refers to."""
+    node_id, _, input_name = key.rpartition(".")
+    if node_id:
+        node = prompt.get(node_id)
+        if not isinstance(node, dict):
+            raise SweepError(f"Node {node_id} not in workflow")
+        inputs = node.get("inputs") or {}
+        if input_name not in inputs:
+            raise SweepError(f"Node {node_id} has no input '{input_name}'")
+        if isinstance(inputs[input_name], list):
+            raise SweepError(f"Input {key} is connected to another node")
+        return [(node_id, input_name)]
+    # Bare input name: every node where it is a widget value, not a link
+    targets = [(nid, input_name) for nid, node in prompt.items()
+               if isinstance(node, dict) and input_name in (node.get("inputs") or {})
+               and not isinstance(node["inputs"][input_name], list)]
+    if not targets:
+        raise SweepError(f"No node has a literal input '{input_name}'")
+    return targets
+
+
+def expand_sweep(prompt, grid, mode="product", max_variants=1000):
+    """Returns [(params, variant_prompt)], params being {grid key: value}. Raises SweepError."""
+    if not isinstance(prompt, dict) or not prompt:
+        raise SweepError("Missing workflow")
+    if not isinstance(grid, dict) or not grid:
+        raise SweepError("Missing parameter grid")
+    if mode not in SWEEP_MODES:
+        raise SweepError(f"Unknown mode {mode!r}")
+
+    keys, targets, axes = [], [], []
+    for key, spec in grid.items():
+        values = _range_values(spec) if isinstance(spec, dict) else spec
+        if not isinstance(values, list) or not values:
+            raise SweepError(f"No values for {key}")
+        keys.append(key)
+        targets.append(_resolve_targets(prompt, str(key)))
+        axes.append(values)
+
+    if mode == "zip":
+        if len({len(v) for v in axes}) > 1:
+            raise SweepError("zip mode needs the same number of values for every key")
+        total = len(axes[0])
+        combos = zip(*axes)
+    else:
+        total = 1
+        for values in axes:
+            total *= len(values)
+        combos = itertools.product(*axes)
+    if total > max_variants:
+        raise SweepError(f"Sweep has {total} variants (limit {max_variants})")
+
+    # One serialization, one C-level parse per variant: variants share nothing
+    base = json.dumps(prompt)
+    variants = []
+    for combo in combos:
+        variant = json.loads(base)
+        for key_targets, value in zip(targets, combo):
+            for node_id, input_name in key_targets:
+                variant[node_id]["inputs"][input_name] = value
+        variants.append((dict(zip(keys, combo)), variant))
+    return variants
+
+
+async def _validate(execution, prompt_id, prompt):
+    # The signature changed over ComfyUI releases: (prompt), (prompt_id, prompt[, partial]); newer ones are async
+    params = len(inspect.signature(execution.validate_prompt).parameters)
+    if params >= 3:
+        result = execution.validate_prompt(prompt_id, prompt, None)
+    elif params == 2:
+        result = execution.validate_prompt(prompt_id, prompt)
+    else:
+        result = execution.validate_prompt(prompt)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def _put_all(prompt_queue, items):
+    """Pushes all items under one lock hold with one status broadcast, instead of one per put()."""
+    if not all(hasattr(prompt_queue, a) for a in ("mutex", "queue", "not_empty", "server")):
+        for item in items:
+            prompt_queue.put(item)
+        return
+    with prompt_queue.mutex:
+        for item in items:
+            heapq.heappush(prompt_queue.queue, item)
+        prompt_queue.server.queue_updated()
+        prompt_queue.not_empty.notify_all()
+
+
+async def enqueue_variants(server, variants, extra_data=None, client_id=None, front=False):
+    """
+    Validates every variant, then inserts all of them into server.prompt_queue.
+    Nothing is queued if any variant fails. Runs on the event loop, like ComfyUI's /prompt.
+    Returns (prompt_ids, None) or (None, error dict).
+    """
+    import execution
+    sensitive_keys = getattr(execution, "SENSITIVE_EXTRA_DATA_KEYS", None)
+    items = []
+    for index, (params, prompt) in enumerate(variants):
+        prompt_id = str(uuid.uuid4())
+        # Shallow copy: only top-level keys are set or popped per variant
+        data = {"prompt": prompt, "extra_data": dict(extra_data or {})}
+        if client_id:
+            data["client_id"] = client_id
+        if hasattr(server, "trigger_on_prompt"):
+            data = server.trigger_on_prompt(data)
+        valid = await _validate(execution, prompt_id, data["prompt"])
+        if not valid[0]:
+            return None, {"variant": index, "params": params, "error": valid[1],
+                          "node_errors": valid[3] if len(valid) > 3 else {}}
+        extra = data.get("extra_data") or {}
+        if client_id:
+            extra["client_id"] = client_id
+        items.append((prompt_id, data["prompt"], extra, valid[2]))
+        if index % 20 == 19:
+            await asyncio.sleep(0)  # Keep websockets served while validating large sweeps
+
+    # The insertion pass: consecutive numbers, so the variants run in grid order
+    first = server.number
+    server.number += len(items)
+    queue_items, prompt_ids = [], []
+    for index, (prompt_id, prompt, extra, outputs) in enumerate(items):
+        # Front of the queue is the most negative number, so count down to keep the order
+        number = -(first + len(items) - index) if front else first + index
+        if sensitive_keys is not None:
+            sensitive = {k: extra.pop(k) for k in sensitive_keys if k in extra}
+            queue_items.append((number, prompt_id, prompt, extra, outputs, sensitive))
+        else:
+            queue_items.append((number, prompt_id, prompt, extra, outputs))
+        prompt_ids.append(prompt_id)
+    _put_all(server.prompt_queue, queue_items)
+    return prompt_ids, None
+
+
+class SweepTracker:
+    """
+    Follows queued sweeps through the run history events and publishes "k of N".
+    publish(event, data): push to observers
+    """
+    def __init__(self, history, publish=None, max_sweeps=32):
+        self.publish = publish
+        self.max_sweeps = max_sweeps
+        self._sweeps = OrderedDict()   # sweep_id -> state
+        self._owner = {}               # prompt_id -> (sweep_id, index)
+        self._reserved = set()         # sweep ids being expanded/validated, not yet added
+        self._lock = threading.Lock()
+        history.listeners.append(self.on_event)
+
+    def reserve(self, sweep_id):
+        """Claims sweep_id before queueing it; False if it is known or already being queued."""
+        with self._lock:
+            if sweep_id in self._sweeps or sweep_id in self._reserved:
+                return False
+            self._reserved.add(sweep_id)
+            return True
+
+    def release(self, sweep_id):
+        """Drops a reservation that did not become a sweep (no-op once added)."""
+        with self._lock:
+            self._reserved.discard(sweep_id)
+
+    def add(self, sweep_id, prompt_ids, params):
+        with self._lock:
+            self._reserved.discard(sweep_id)
+            self._sweeps[sweep_id] = {
+                "prompt_ids": prompt_ids, "params": params, "finished": set(),
+                "failed": 0, "running": None, "created": time.time(),
+            }
+            for index, prompt_id in enumerate(prompt_ids):
+                self._owner[prompt_id] = (sweep_id, index)
+            while len(self._sweeps) > self.max_sweeps:
+                _old_id, old = self._sweeps.popitem(last=False)
+                for prompt_id in old["prompt_ids"]:
+                    self._owner.pop(prompt_id, None)
+            snapshot = self._snapshot(sweep_id)
+        if self.publish:
+            self.publish(SWEEP_EVENT, snapshot)
+        return snapshot
+
+    def _snapshot(self, sweep_id):
+        sweep = self._sweeps.get(sweep_id)
+        if sweep is None:
+            return None
+        running = sweep["running"]
+        n, k = len(sweep["prompt_ids"]), len(sweep["finished"])
+        return {
+            "sweep_id": sweep_id,
+            "k": k,
+            "n": n,
+            "running": running + 1 if running is not None else None,
+            "params": sweep["params"][running] if running is not None else None,
+            "failed": sweep["failed"],
+            "done": k >= n,
+        }
+
+    def snapshot(self, sweep_id):
+        with self._lock:
+            return self._snapshot(sweep_id)
+
+    def on_event(self, event, data, ts, run):
+        prompt_id = (data or {}).get("prompt_id")
+        if not prompt_id:
+            return
+        with self._lock:
+            owner = self._owner.get(prompt_id)
+            if owner is None:
+                return
+            sweep_id, index = owner
+            sweep = self._sweeps[sweep_id]
+            if event == "execution_start":
+                sweep["running"] = index
+            elif event in ("execution_success", "execution_error", "execution_interrupted") or \
+                    (event == "executing" and data.get("node") is None):
+                if index in sweep["finished"]:
+                    return
+                sweep["finished"].add(index)
+                if event != "execution_success" and event != "executing":
+                    sweep["failed"] += 1
+                if sweep["running"] == index:
+                    sweep["running"] = None
+            else:
+                return
+            snapshot = self._snapshot(sweep_id)
+        if self.publish:
+            self.publish(SWEEP_EVENT, snapshot)
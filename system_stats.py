@@ -0,0 +1,110 @@
+"""
+Shared, background-computed /system_stats snapshot.
+
+Every desktop client polls the server as a health check. Instead of letting
+ComfyUI recompute device stats for each of them, one worker thread computes
+the stats at most every `interval` seconds and the endpoint serves that
+snapshot with an ETag, so a client whose copy is current gets an empty 304.
+
+The worker only runs while someone is interested: a request within the last
+`idle_after` seconds, or observers when pushing is enabled. Pushes
+(`run_button.system_stats`) are only sent when the snapshot changed.
+"""
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+STATS_EVENT = "run_button.system_stats"
+
+
+def find_comfy_handler(server, path="/system_stats"):
+    """ComfyUI's own GET handler for `path`, so the snapshot has exactly the upstream format."""
+    # PromptServer.routes is filled in its constructor; app.router only once add_routes() ran
+    for route in getattr(server, "routes", None) or []:
+        if getattr(route, "method", None) == "GET" and getattr(route, "path", None) == path:
+            return route.handler
+    for route in server.app.router.routes():
+        if route.method == "GET" and route.resource and route.resource.canonical == path:
+            return route.handler
+    return None
+
+
+class SystemStatsCache:
+    """
+    compute(): returns the stats dict (called on the worker thread)
+    publish(event, data) / has_observers(): optional push to observers
+    """
+    def __init__(self, compute, interval=2.0, idle_after=60.0, publish=None, has_observers=None):
+        self.compute = compute
+        self.interval = interval
+        self.idle_after = idle_after
+        self.publish = publish
+        self.has_observers = has_observers
+        self.body = None        # JSON bytes of the current snapshot
+        self.etag = None
+        self.computed_at = 0.0
+        self._last_request = 0.0
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="RunButtonStats")
+        self._thread.start()
+
+    def _wanted(self):
+        if time.monotonic() - self._last_request < self.idle_after:
+            return True
+        return bool(self.publish and self.has_observers and self.has_observers())
+
+    def _loop(self):
+        while True:
+            if not self._wanted():
+                # Nobody is watching: sleep until a request comes in
+                self._wake.wait(self.interval * 5)
+                self._wake.clear()
+                continue
+            started = time.monotonic()
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"[RunButton] System stats refresh failed: {e}")
+            self._ready.set()
+            self._wake.wait(max(0.0, self.interval - (time.monotonic() - started)))
+            self._wake.clear()
+
+    def _refresh(self):
+        stats = self.compute()
+        body = json.dumps(stats, sort_keys=True).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        changed = etag != self.etag
+        self.body, self.etag, self.computed_at = body, etag, time.time()
+        if changed and self.publish and self.has_observers and self.has_observers():
+            self.publish(STATS_EVENT, stats)
+
+    def get(self, timeout=3.0):
+        """
+        Marks interest and returns (body, etag). Blocking: if there is no snapshot yet, or it is
+        older than `interval` (the worker was idle), waits up to `timeout` for a fresh one and
+        only serves the stale snapshot if that times out.
+        """
+        self._last_request = time.monotonic()
+        if self.body is None or time.time() - self.computed_at > self.interval:
+            self._ready.clear()
+            self._wake.set()
+            self._ready.wait(timeout)
+        return self.body, self.etag
+
+
+def comfy_stats_computer(server):
+    """Wraps ComfyUI's async handler into a plain function for the worker thread."""
+    loop = asyncio.new_event_loop()
+    handler = None
+
+    def compute():
+        nonlocal handler
+        handler = handler or find_comfy_handler(server)
+        if handler is None:
+            raise RuntimeError("ComfyUI /system_stats handler not found")
+        response = loop.run_until_complete(handler(None))
+        return json.loads(response.body)
+    return compute
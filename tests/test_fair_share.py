@@ -0,0 +1,64 @@
+import os
+import sys
+import heapq
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fair_share import FairScheduler, parse_quotas
+
+
+class FakeHistory:
+    def __init__(self):
+        self.listeners = []
+
+
+class FakePromptQueue:
+    """The parts of ComfyUI's PromptQueue the scheduler touches."""
+    def __init__(self):
+        self.mutex = threading.RLock()
+        self.queue = []
+        self.currently_running = {}
+
+    def put(self, number, prompt_id, client_id):
+        heapq.heappush(self.queue, (number, prompt_id, {}, {"client_id": client_id}, []))
+
+    def order(self):
+        return [item[1] for item in sorted(self.queue)]
+
+
+class FairSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = FakePromptQueue()
+        self.scheduler = FairScheduler(FakeHistory(), self.queue, owner_for_client=lambda sid: sid.split("-")[0])
+
+    def test_pending_queue_is_interleaved_by_owner(self):
+        for number, prompt_id in enumerate(["a1", "a2", "a3", "b1", "c1", "c2"]):
+            self.queue.put(number, prompt_id, prompt_id[0] + "-tab")
+        self.queue.put(-1, "front", "a-tab")
+        self.assertTrue(self.scheduler.rebalance())
+        self.assertEqual(self.queue.order(), ["front", "a1", "b1", "c1", "a2", "c2", "a3"])
+        self.assertFalse(self.scheduler.rebalance())
+
+    def test_owner_served_last_goes_last(self):
+        for number, prompt_id in enumerate(["a1", "a2", "a3", "b1"]):
+            self.queue.put(number, prompt_id, prompt_id[0] + "-tab")
+        self.scheduler.rebalance()
+        self.assertEqual(self.queue.order(), ["a1", "b1", "a2", "a3"])
+        self.queue.currently_running[0] = heapq.heappop(self.queue.queue)
+        self.scheduler.on_event("execution_start", {"prompt_id": "a1"}, 10.0, None)
+        self.assertEqual(self.queue.order(), ["b1", "a2", "a3"])
+
+    def test_quota(self):
+        scheduler = FairScheduler(FakeHistory(), self.queue, quota=2, quotas=parse_quotas("vip=5, bad, x=y"))
+        self.queue.put(0, "p0", "tab-1")
+        self.assertEqual(scheduler.quotas, {"vip": 5})
+        scheduler.assign("tab-1", "alice")
+        self.assertEqual(scheduler.admit("alice"), (True, 1))
+        self.assertEqual(scheduler.admit("alice", 2), (False, 1))
+        self.assertEqual(scheduler.admit("vip", 5), (True, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
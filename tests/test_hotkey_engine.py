@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hotkey_engine import HotkeyEngine, Binding
+
+
+class FakeBackend:
+    """Behaves like RegisterHotKey: the same combination cannot be registered twice."""
+    def __init__(self, on_hotkey):
+        self.on_hotkey = on_hotkey
+        self.registered = {}  # hid -> (mods, key)
+
+    def call(self, fn):
+        return fn()
+
+    def register(self, hid, step):
+        combo = (step[1], step[2])
+        if combo in self.registered.values():
+            raise OSError(1409, "already registered")
+        self.registered[hid] = combo
+
+    def unregister(self, hid):
+        self.registered.pop(hid, None)
+
+    def close(self):
+        pass
+
+    def press(self, combo):
+        for hid, registered in list(self.registered.items()):
+            if registered == combo:
+                self.on_hotkey(hid, 0.0)
+                return True
+        return False
+
+
+class FakeEngine(HotkeyEngine):
+    def _create_backend(self, backend):
+        return FakeBackend(self._on_hotkey)
+
+
+CTRL = 0x0002
+
+
+class ChordPrefixTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = FakeEngine(chord_timeout=5.0)
+        self.fired = []
+        self.failures = self.engine.apply([
+            Binding("save", "ctrl+k, s", lambda: self.fired.append("save"), debounce=0),
+            Binding("run", "ctrl+k, r", lambda: self.fired.append("run"), debounce=0),
+        ])
+        self.backend = self.engine._backend
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_shared_prefix_registers_once(self):
+        self.assertEqual(self.failures, [])
+        self.assertEqual(list(self.backend.registered.values()), [(CTRL, "k")])
+
+    def test_both_chords_fire(self):
+        self.assertTrue(self.backend.press((CTRL, "k")))
+        self.assertTrue(self.backend.press((0, "r")))
+        self.assertTrue(self.backend.press((CTRL, "k")))
+        self.assertTrue(self.backend.press((0, "s")))
+        self.assertEqual(self.fired, ["run", "save"])
+
+    def test_continuations_disarmed_after_chord(self):
+        self.backend.press((CTRL, "k"))
+        self.backend.press((0, "s"))
+        self.assertFalse(self.backend.press((0, "r")))
+        self.assertEqual(list(self.backend.registered.values()), [(CTRL, "k")])
+
+
+if __name__ == "__main__":
+    unittest.main()
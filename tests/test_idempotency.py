@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import idempotency
+from idempotency import IdempotencyCache, MAX_KEY_LENGTH
+
+
+class IdempotencyCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(idempotency.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = IdempotencyCache(ttl=60.0, max_entries=3)
+
+    def test_retry_replays_stored_response(self):
+        self.assertIsNone(self.cache.get("press-1"))
+        self.cache.put("press-1", {"status": "triggered", "message": "Sent to a"})
+        self.assertEqual(self.cache.get("press-1"), {"status": "triggered", "message": "Sent to a"})
+        self.assertIsNone(self.cache.get("press-2"))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.put("press-1", {"status": "triggered"})
+        self.now += 59
+        self.assertIsNotNone(self.cache.get("press-1"))
+        self.now += 2
+        self.assertIsNone(self.cache.get("press-1"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_oldest_evicted_beyond_max_entries(self):
+        for key in ("a", "b", "c"):
+            self.cache.put(key, key)
+        self.cache.put("a", "a2")  # Re-putting makes it the newest
+        self.cache.put("d", "d")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual([self.cache.get(k) for k in ("a", "c", "d")], ["a2", "c", "d"])
+
+    def test_normalize(self):
+        self.assertEqual(IdempotencyCache.normalize("  key "), "key")
+        self.assertIsNone(IdempotencyCache.normalize(""))
+        self.assertIsNone(IdempotencyCache.normalize(42))
+        self.assertIsNone(IdempotencyCache.normalize("x" * (MAX_KEY_LENGTH + 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
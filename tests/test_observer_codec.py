@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from observer_codec import ObserverEncoder, ObserverDecoder
+
+EVENTS = [
+    ("status", {"status": {"exec_info": {"queue_remaining": 3}}, "sid": "abc"}),
+    ("execution_start", {"prompt_id": "p1", "timestamp": 1}),
+    ("executing", {"node": "7", "display_node": "7", "prompt_id": "p1"}),
+    ("progress", {"value": 5, "max": 20, "prompt_id": "p1", "node": "7"}),
+    ("executing", {"node": None, "prompt_id": "p1"}),
+    ("execution_start", {"prompt_id": "p2"}),
+    ("progress", {"value": 1, "max": 20, "prompt_id": "p2", "node": "3"}),
+    ("run_button.sweep", {"sweep_id": "s", "k": 1, "n": 4}),
+]
+
+EXPECTED = [
+    ("status", {"status": {"exec_info": {"queue_remaining": 3}}}),
+    ("execution_start", {"prompt_id": "p1"}),
+    ("executing", {"node": "7", "prompt_id": "p1"}),
+    ("progress", {"value": 5, "max": 20, "prompt_id": "p1", "node": "7"}),
+    ("executing", {"node": None, "prompt_id": "p1"}),
+    ("execution_start", {"prompt_id": "p2"}),
+    ("progress", {"value": 1, "max": 20, "prompt_id": "p2", "node": "3"}),
+    ("run_button.sweep", {"sweep_id": "s", "k": 1, "n": 4}),
+]
+
+
+class ObserverCodecTest(unittest.TestCase):
+    def round_trip(self, encoding, use_zlib):
+        encoder, decoder = ObserverEncoder(encoding, use_zlib), ObserverDecoder()
+        self.assertEqual(decoder.feed(encoder.hello()), [])
+        decoded = []
+        for event, data in EVENTS:
+            decoded.extend(decoder.feed(encoder.encode(event, data)))
+        return decoded
+
+    def test_compact_round_trip(self):
+        self.assertEqual(self.round_trip("compact", False), EXPECTED)
+
+    def test_binary_zlib_round_trip(self):
+        self.assertEqual(self.round_trip("binary", True), EXPECTED)
+
+    def test_prompt_id_sent_only_when_it_changes(self):
+        encoder = ObserverEncoder("compact")
+        first = encoder.encode("progress", {"value": 1, "max": 2, "prompt_id": "p1", "node": "7"})
+        second = encoder.encode("progress", {"value": 2, "max": 2, "prompt_id": "p1", "node": "7"})
+        self.assertIn('"p":"p1"', first)
+        self.assertNotIn('"p"', second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sweep import SweepError, SweepTracker, expand_sweep
+
+PROMPT = {
+    "3": {"class_type": "KSampler", "inputs": {"seed": 1, "cfg": 7.0, "model": ["4", 0]}},
+    "9": {"class_type": "KSampler", "inputs": {"seed": 2, "cfg": 7.0, "model": ["4", 0]}},
+}
+
+
+class FakeHistory:
+    def __init__(self):
+        self.listeners = []
+
+
+class ExpandSweepTest(unittest.TestCase):
+    def test_product_sets_every_combination(self):
+        variants = expand_sweep(PROMPT, {"3.seed": [1, 2], "cfg": {"start": 4, "stop": 5, "step": 1}})
+        self.assertEqual([params for params, _ in variants],
+                         [{"3.seed": 1, "cfg": 4}, {"3.seed": 1, "cfg": 5},
+                          {"3.seed": 2, "cfg": 4}, {"3.seed": 2, "cfg": 5}])
+        params, variant = variants[-1]
+        self.assertEqual(variant["3"]["inputs"]["seed"], 2)
+        self.assertEqual(variant["9"]["inputs"]["cfg"], 5)   # Bare key: every node
+        self.assertEqual(variant["9"]["inputs"]["seed"], 2)   # "3.seed" only touches node 3
+        self.assertEqual(PROMPT["3"]["inputs"]["seed"], 1)   # Source untouched
+
+    def test_zip_pairs_values(self):
+        variants = expand_sweep(PROMPT, {"3.seed": [1, 2], "9.seed": [3, 4]}, mode="zip")
+        self.assertEqual([params for params, _ in variants], [{"3.seed": 1, "9.seed": 3}, {"3.seed": 2, "9.seed": 4}])
+        with self.assertRaises(SweepError):
+            expand_sweep(PROMPT, {"3.seed": [1, 2], "9.seed": [3]}, mode="zip")
+
+    def test_rejects_bad_grids(self):
+        for grid in ({"3.model": [1]}, {"5.seed": [1]}, {"steps": [1]}, {"3.seed": []}):
+            with self.assertRaises(SweepError):
+                expand_sweep(PROMPT, grid)
+        with self.assertRaises(SweepError):
+            expand_sweep(PROMPT, {"3.seed": list(range(11))}, max_variants=10)
+
+
+class SweepTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.history = FakeHistory()
+        self.published = []
+        self.tracker = SweepTracker(self.history, publish=lambda event, data: self.published.append(data))
+
+    def test_reserved_id_cannot_be_queued_twice(self):
+        self.assertTrue(self.tracker.reserve("s1"))
+        self.assertFalse(self.tracker.reserve("s1"))
+        self.tracker.add("s1", ["a", "b"], [{"seed": 1}, {"seed": 2}])
+        self.tracker.release("s1")
+        self.assertFalse(self.tracker.reserve("s1"))
+        self.assertTrue(self.tracker.reserve("s2"))
+        self.tracker.release("s2")
+        self.assertTrue(self.tracker.reserve("s2"))
+
+    def test_progress_k_of_n(self):
+        self.tracker.add("s1", ["a", "b"], [{"seed": 1}, {"seed": 2}])
+        on_event = self.history.listeners[0]
+        on_event("execution_start", {"prompt_id": "a"}, 0.0, None)
+        self.assertEqual((self.published[-1]["running"], self.published[-1]["params"]), (1, {"seed": 1}))
+        on_event("execution_success", {"prompt_id": "a"}, 1.0, None)
+        on_event("execution_error", {"prompt_id": "b"}, 2.0, None)
+        snapshot = self.tracker.snapshot("s1")
+        self.assertEqual((snapshot["k"], snapshot["n"], snapshot["failed"], snapshot["done"]), (2, 2, 1, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trigger_backlog
+from trigger_backlog import TriggerBacklog
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class TriggerBacklogTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(trigger_backlog.time, "time", self.clock.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backlog = TriggerBacklog(depth=2, ack_timeout=5.0)
+
+    def test_unconfirmed_release_is_dropped_not_resent(self):
+        self.backlog.add(1)
+        self.assertTrue(self.backlog.take())
+        self.clock.now += 6
+        self.assertEqual(self.backlog.local, 0)
+        self.assertEqual(self.backlog.expired, 1)
+        self.assertFalse(self.backlog.take())
+        # The expired release no longer holds a queue slot
+        self.backlog.add(2)
+        self.assertTrue(self.backlog.take())
+        self.assertTrue(self.backlog.take())
+
+    def test_give_back_after_failed_delivery(self):
+        self.backlog.add(2)
+        self.assertTrue(self.backlog.take())
+        self.backlog.give_back()
+        self.assertEqual(self.backlog.local, 2)
+        self.assertTrue(self.backlog.take())
+        self.assertTrue(self.backlog.take())
+        self.assertFalse(self.backlog.take())
+
+    def test_queue_growth_confirms_releases(self):
+        self.backlog.add(3)
+        self.assertTrue(self.backlog.take())
+        self.assertTrue(self.backlog.take())
+        self.assertFalse(self.backlog.take())
+        self.backlog.on_queue(2)
+        self.clock.now += 6
+        self.assertEqual(self.backlog.expired, 0)
+        self.assertFalse(self.backlog.take())
+        self.backlog.on_queue(1)
+        self.assertTrue(self.backlog.take())
+        self.assertEqual(self.backlog.local, 0)
+
+    def test_clear_drops_held_and_in_flight(self):
+        self.backlog.add(3)
+        self.backlog.take()
+        self.assertEqual(self.backlog.clear(), 2)
+        self.clock.now += 6
+        self.assertEqual(self.backlog.local, 0)
+        self.assertEqual(self.backlog.expired, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trigger_outbox
+from trigger_outbox import TriggerOutbox
+
+
+class TriggerOutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(trigger_outbox.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "outbox.json")
+        self.outbox = TriggerOutbox(self.path, expiry=120.0, dedupe_window=3.0)
+
+    def test_repeated_presses_merge(self):
+        self.assertTrue(self.outbox.push("trigger"))
+        self.now += 1
+        self.assertFalse(self.outbox.push("trigger"))
+        self.assertTrue(self.outbox.push("interrupt"))
+        self.assertFalse(self.outbox.push("interrupt"))
+        self.now += 5
+        self.assertTrue(self.outbox.push("trigger"))
+        self.assertEqual([e["action"] for e in self.outbox.pending()], ["trigger", "interrupt", "trigger"])
+
+    def test_expired_entries_are_not_replayed(self):
+        self.outbox.push("trigger")
+        self.now += 100
+        self.outbox.push("trigger", count=4)
+        self.now += 30
+        self.assertEqual([e["count"] for e in self.outbox.pending()], [4])
+        self.assertEqual(len(self.outbox), 1)
+
+    def test_survives_restart_until_acked(self):
+        self.outbox.push("trigger", count=2)
+        entry, = TriggerOutbox(self.path).pending()
+        self.assertEqual(entry["count"], 2)
+        self.outbox.ack(entry["id"])
+        self.assertEqual(TriggerOutbox(self.path).pending(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Client-side admission control for queued presses ("backlog mode").
+
+Instead of sending every press of a batch straight to ComfyUI, presses are
+counted locally and released one at a time while the server's reported
+`queue_remaining` (running + pending prompts) is below `depth`. This keeps
+the server queue short, so a Stop press (which also drops the local backlog)
+actually stops the batch, and the history is not flooded with prompts that
+were never wanted.
+
+A released trigger only shows up in `queue_remaining` after the browser has
+queued it, so releases are counted as "in flight" until a status event
+reports the queue growing. A release that is not confirmed within
+`ack_timeout` seconds stops holding a queue slot and is dropped, not sent
+again: it reached the browser, which may still queue it late or may have
+refused it (invalid workflow), and a resend could run it twice. Only a
+release that could not be delivered at all is given back (give_back()).
+Pure bookkeeping, no I/O: RunEngine decides when to call take().
+"""
+import time
+import threading
+
+
+class TriggerBacklog:
+    def __init__(self, depth=2, ack_timeout=5.0):
+        self.depth = max(1, int(depth))
+        self.ack_timeout = ack_timeout
+        self.remote = 0          # Last queue_remaining reported by the server
+        self._local = 0
+        self._in_flight = []     # Release timestamps not yet seen in queue_remaining
+        self.expired = 0         # Releases dropped because no queue growth confirmed them
+        self._lock = threading.Lock()
+
+    @property
+    def local(self):
+        with self._lock:
+            self._expire(time.time())
+            return self._local
+
+    def add(self, count=1):
+        with self._lock:
+            self._local += max(0, count)
+            return self._local
+
+    def clear(self):
+        """Drops presses that were not released yet. Returns how many were dropped."""
+        with self._lock:
+            dropped, self._local = self._local, 0
+            # Unconfirmed releases must not come back after a Stop either
+            self._in_flight = []
+            return dropped
+
+    def on_queue(self, remaining):
+        """Called for every status event with the server's queue_remaining."""
+        with self._lock:
+            grown = remaining - self.remote
+            if grown > 0:
+                del self._in_flight[:grown]
+            self.remote = remaining
+
+    def _expire(self, now):
+        while self._in_flight and now - self._in_flight[0] > self.ack_timeout:
+            self._in_flight.pop(0)
+            self.expired += 1
+
+    def take(self):
+        """Claims one press for release if the server queue has room. Returns True if claimed."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if self._local <= 0 or self.remote + len(self._in_flight) >= self.depth:
+                return False
+            self._local -= 1
+            self._in_flight.append(now)
+            return True
+
+    def give_back(self):
+        """A claimed press could not be delivered (no browser, request failed): put it back."""
+        with self._lock:
+            self._local += 1
+            if self._in_flight:
+                self._in_flight.pop()
@@ -0,0 +1,97 @@
+"""
+Persistent outbox for presses made while ComfyUI is unreachable.
+
+Triggers and interrupts are written to a small JSON file with their
+timestamps, so they survive a ComfyUI restart (or a restart of the app
+itself) and can be replayed in order once the websocket is back.
+
+  * expiry  : entries older than `expiry` seconds are dropped on replay
+  * dedupe  : a trigger pressed within `dedupe_window` seconds of the
+              previous buffered trigger is merged into it, and repeated
+              interrupts collapse into one - so hammering the button during
+              an outage does not turn into an unwanted batch.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import uuid
+
+
+class TriggerOutbox:
+    def __init__(self, path, expiry=120.0, dedupe_window=3.0, max_entries=50):
+        self.path = path
+        self.expiry = expiry
+        self.dedupe_window = dedupe_window
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return [e for e in entries if isinstance(e, dict) and e.get("action") in ("trigger", "interrupt")]
+        except Exception as e:
+            logging.warning(f"Outbox file unreadable, starting empty: {e}")
+            return []
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logging.error(f"Failed to persist outbox: {e}")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def push(self, action, count=1):
+        """Buffer an action. Returns False if it was merged into an existing entry."""
+        now = time.time()
+        with self._lock:
+            last = self._entries[-1] if self._entries else None
+            if last and last["action"] == action:
+                if action == "interrupt":
+                    last["ts"] = now
+                    self._save()
+                    return False
+                if now - last["ts"] < self.dedupe_window and count <= last["count"]:
+                    last["ts"] = now
+                    self._save()
+                    return False
+
+            self._entries.append({"id": uuid.uuid4().hex, "action": action, "count": count, "ts": now})
+            if len(self._entries) > self.max_entries:
+                dropped = self._entries.pop(0)
+                logging.warning(f"Outbox full, dropped oldest {dropped['action']}")
+            self._save()
+            return True
+
+    def pending(self):
+        """Live entries in submission order. Expired entries are discarded."""
+        now = time.time()
+        with self._lock:
+            live = [e for e in self._entries if now - e["ts"] <= self.expiry]
+            expired = len(self._entries) - len(live)
+            if expired:
+                logging.info(f"Outbox: discarded {expired} expired entr{'y' if expired == 1 else 'ies'}")
+                self._entries = live
+                self._save()
+            return [dict(e) for e in live]
+
+    def ack(self, entry_id):
+        with self._lock:
+            self._entries = [e for e in self._entries if e["id"] != entry_id]
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._save()
@@ -0,0 +1,154 @@
+"""
+Minimal WebSocket support (RFC 6455) shared by the local servers: the state
+relay, the browser handshake sidecar, the extension server (run_engine.py)
+and the replay tool's fake ComfyUI. Text and control frames, no extensions.
+Stdlib only.
+"""
+import os
+import json
+import base64
+import struct
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def ws_frame(payload, mask=False, opcode=0x1):
+    """One final frame (text by default); clients must mask, servers must not."""
+    payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, mask_bit | length)
+    elif length < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, mask_bit | 127, length)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    full = (key * (length // 4 + 1))[:length]
+    masked = (int.from_bytes(payload, "big") ^ int.from_bytes(full, "big")).to_bytes(length, "big") if length else b""
+    return header + key + masked
+
+
+def ws_read_frame(read_exact):
+    """
+    Reads one frame with read_exact(n) (returns n bytes or raises ConnectionError).
+    Returns (fin, opcode, unmasked payload).
+    """
+    b1, b2 = read_exact(2)
+    length = b2 & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", read_exact(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", read_exact(8))[0]
+    mask = read_exact(4) if b2 & 0x80 else None
+    payload = read_exact(length) if length else b""
+    if mask and payload:
+        # XOR the whole payload at once instead of byte by byte
+        key = (mask * (length // 4 + 1))[:length]
+        payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+    return bool(b1 & 0x80), b1 & 0x0F, payload
+
+
+def socket_reader(sock):
+    """read_exact(n) for a plain socket."""
+    def read_exact(n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("WebSocket peer closed")
+            buf.extend(chunk)
+        return bytes(buf)
+    return read_exact
+
+
+class WebSocketRequestHandler(BaseHTTPRequestHandler):
+    """
+    BaseHTTPRequestHandler that can also upgrade a request to a websocket.
+    Shared by the state relay and the browser handshake sidecar.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args): return
+
+    def _json(self, body, status=200, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Cache-Control", "no-store")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json_body(self):
+        """Returns the parsed JSON body, or None if it is not valid JSON."""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length).decode("utf-8") or "{}") if length else {}
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def is_websocket_request(self):
+        return self.headers.get("Upgrade", "").lower() == "websocket"
+
+    def accept_websocket(self):
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", ws_accept_key(self.headers.get("Sec-WebSocket-Key", "")))
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        self.connection.settimeout(None)
+        self._send_lock = threading.Lock()
+
+    def serve_websocket(self, on_text):
+        """Reads messages until the peer closes; on_text(str) is called per complete text message."""
+        try:
+            message = bytearray()
+            while True:
+                fin, opcode, payload = ws_read_frame(self._read_exact)
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    self.send_frame(ws_frame(payload, opcode=0xA))
+                    continue
+                if opcode not in (0x0, 0x1):
+                    continue
+                message.extend(payload)
+                if fin:
+                    on_text(message.decode("utf-8", "replace"))
+                    message = bytearray()
+        except (ConnectionError, OSError):
+            pass
+
+    def _read_exact(self, n):
+        data = self.rfile.read(n)
+        if len(data) < n:
+            raise ConnectionError("WebSocket peer closed")
+        return data
+
+    def send_text(self, text):
+        return self.send_frame(ws_frame(text))
+
+    def send_frame(self, frame):
+        """Thread-safe. Returns False (and closes the socket, ending the read loop) if the peer is gone."""
+        try:
+            with self._send_lock:
+                self.connection.sendall(frame)
+            return True
+        except OSError:
+            try: self.connection.close()
+            except OSError: pass
+            return False